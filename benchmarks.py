@@ -0,0 +1,342 @@
+#! /usr/bin/env python3
+
+# benchmarks -- timing checks for the report scripts, to catch performance regressions
+
+import argparse
+import datetime
+import gc
+import logging
+import json
+import subprocess
+import random
+import time
+import sys
+
+import init_logging
+log = logging.getLogger(__name__)
+
+
+# entry points, and the heavy modules importing each one must NOT pull in
+STARTUP_ENTRY_POINTS = {
+        'daily_staffing_reports':       [ 'selenium', 'O365', 'requests_html', 'requests', 'jinja2' ],
+        'daily_availability_reports':   [ 'selenium', 'O365', 'requests_html', 'requests', 'jinja2' ],
+        'roster':                       [ 'selenium', 'O365', 'requests_html', 'requests', 'jinja2' ],
+        'vc_session':                   [ 'selenium', 'O365', 'requests_html' ],
+        }
+
+STARTUP_PROBE = """
+import json, sys, time
+start = time.perf_counter()
+import {module}
+elapsed = time.perf_counter() - start
+heavy = [ m for m in {heavy!r} if m in sys.modules ]
+print(json.dumps({{ 'ms': elapsed * 1000, 'heavy': heavy }}))
+"""
+
+
+def main():
+    args = parse_args()
+    if args.debug:
+        logging.getLogger().setLevel(logging.DEBUG)
+
+    ok = args.func(args)
+    sys.exit(0 if ok else 1)
+
+
+def bench_startup(args):
+    """ time a cold import of each entry point, in a fresh interpreter each time
+
+        Fails if an entry point loads one of its forbidden heavy modules at import time, or
+        (with --max-ms) if the best of --repeat imports takes longer than that.
+    """
+
+    ok = True
+    for module, heavy in STARTUP_ENTRY_POINTS.items():
+        if args.module and module not in args.module:
+            continue
+
+        times = []
+        for i in range(args.repeat):
+            probe = STARTUP_PROBE.format(module=module, heavy=heavy)
+            output = subprocess.run([ sys.executable, '-c', probe ], capture_output=True, text=True)
+            if output.returncode != 0:
+                log.error(f"{ module }: import failed\n{ output.stderr }")
+                ok = False
+                break
+
+            result = json.loads(output.stdout.strip().splitlines()[-1])
+            times.append(result['ms'])
+
+        if len(times) == 0:
+            continue
+
+        best = min(times)
+        status = 'ok'
+        if len(result['heavy']) > 0:
+            status = f"FAIL: imports { ', '.join(result['heavy']) }"
+            ok = False
+        elif args.max_ms is not None and best > args.max_ms:
+            status = f"FAIL: over { args.max_ms } ms"
+            ok = False
+
+        print(f"{ module:30s} best { best:7.1f} ms  median { sorted(times)[len(times) // 2]:7.1f} ms  { status }")
+
+    return ok
+
+
+# columns of the synthetic roster used by bench_copy: (title, kind)
+COPY_COLUMNS = [
+        ('Name', 'text'), ('Email', 'text'), ('Cell phone', 'text'), ('District', 'text'),
+        ('GAP(s)', 'text'), ('Arrive date', 'date'), ('Checked in', 'date'),
+        ('Expect release', 'date'), ('DaysRemain', 'number'), ('Reporting/Work Location', 'text'),
+        ('Current lodging', 'text'), ('Current/Last Supervisor', 'text'),
+        ]
+
+
+class SyntheticSheet:
+    """ just enough of an xlrd sheet for report_table.ReportTable """
+
+    class book:
+        formatting_info = False
+
+    def __init__(self, rows, seed=1):
+        rng = random.Random(seed)
+        base = 45000    # an Excel serial date in 2023
+
+        self.columns = []
+        for title, kind in COPY_COLUMNS:
+            if kind == 'date':
+                values = [ float(base + rng.randrange(-10, 10)) if rng.random() < 0.9 else '' for i in range(rows) ]
+            elif kind == 'number':
+                values = [ float(rng.randrange(0, 20)) for i in range(rows) ]
+            else:
+                values = [ f"{ title } { rng.randrange(1000) }" for i in range(rows) ]
+            self.columns.append([ title ] + values)
+
+        self.nrows = rows + 1
+        self.ncols = len(self.columns)
+
+    def col_values(self, col):
+        return list(self.columns[col])
+
+
+class NullSheet:
+    """ an output worksheet that throws cells away, to time the copy loop on its own """
+
+    class Cell:
+        __slots__ = ('value', 'number_format', 'alignment', 'fill')
+
+    def cell(self, row, column, value=None):
+        cell = NullSheet.Cell()
+        cell.value = value
+        return cell
+
+
+def day_offset(value, today_serial):
+    """ excel_dates.day_offsets for one cell, as the old copy loop worked it out """
+
+    import excel_dates
+
+    if isinstance(value, (int, float)):
+        return int(value) - today_serial
+    return excel_dates.NO_DATE
+
+
+def bucket(offset):
+    """ 'past', 'today', 'tomorrow' or None for a day offset, one cell at a time """
+
+    import excel_dates
+
+    if offset == excel_dates.NO_DATE:
+        return None
+    if offset < 0:
+        return 'past'
+    return { 0: 'today', 1: 'tomorrow' }.get(offset)
+
+
+def copy_params():
+    """ report params like the staffing scripts use, with formats, fills and alignments """
+
+    import openpyxl
+    import excel_dates
+
+    left = openpyxl.styles.Alignment(horizontal='left')
+    fill = openpyxl.styles.PatternFill(fgColor='C9E2B8', fill_type='solid')
+    today_serial = excel_dates.to_serial(datetime.date(2023, 3, 15))
+
+    def filter_date(cell):
+        if bucket(day_offset(cell.value, today_serial)) == 'today':
+            cell.fill = fill
+
+    return {
+            'column_formats': { 'Arrive date': 'yyyy-mm-dd', 'Checked in': 'yyyy-mm-dd', 'Expect release': 'yyyy-mm-dd', },
+            'column_alignments': { 'Arrive date': left, 'Checked in': left, 'Expect release': left, },
+            'column_fills': { 'Arrive date': filter_date, },
+            }
+
+
+def reference_copy(in_ws, out_ws, params, in_column_map, out_column_map):
+    """ the copy loop as it was before sheet_plan: dict lookups for every cell """
+
+    col_format = params['column_formats']
+    col_fills = params['column_fills']
+    col_alignment = params['column_alignments']
+
+    in_columns = in_ws.columns
+    out_index = 0
+    for in_row_index in range(in_ws.nrows):
+        out_index += 1
+
+        for col_name, out_col in out_column_map.items():
+            in_col = in_column_map[col_name]
+            cell = out_ws.cell(row=out_index, column=out_col, value=in_columns[in_col][in_row_index])
+
+            if in_row_index != 0:
+                if col_name in col_format:
+                    cell.number_format = col_format[col_name]
+
+                if col_name in col_fills:
+                    col_fills[col_name](cell)
+
+            if col_name in col_alignment:
+                cell.alignment = col_alignment[col_name]
+
+
+def planned_copy(in_ws, out_ws, params, in_column_map, out_column_map):
+    """ the copy loop using a compiled sheet_plan, with named styles on a real sheet """
+
+    import sheet_plan
+    import report_styles
+
+    styles = report_styles.registry(out_ws.parent) if not isinstance(out_ws, NullSheet) else None
+    plan = sheet_plan.compile_plan(in_ws.columns, in_column_map, out_column_map, params, styles=styles)
+    sheet_plan.write_title_row(out_ws, 1, plan)
+    sheet_plan.write_rows(out_ws, 2, plan, range(1, in_ws.nrows), styles)
+
+
+def bench_copy(args):
+    """ per-cell cost of copying a large roster, with the old dict lookup loop and with sheet_plan
+
+        Each loop is timed writing to a real openpyxl sheet and to a NullSheet (which shows the
+        loop's own overhead).  With --min-speedup, fails if the planned loop isn't at least that
+        much faster than the old one on the NullSheet.
+    """
+
+    import openpyxl
+    import report_table
+
+    in_ws = report_table.ReportTable(SyntheticSheet(args.rows))
+    titles = in_ws.row_values(0)
+    in_column_map = { title: col for col, title in enumerate(titles) }
+    out_column_map = { title: col +1 for col, title in enumerate(titles) }
+    params = copy_params()
+    cells = in_ws.nrows * in_ws.ncols
+
+    ok = True
+    for sink_name, make_sink in (('null', NullSheet), ('openpyxl', lambda: openpyxl.Workbook().active)):
+        best = {}
+        for name, copy in (('reference', reference_copy), ('plan', planned_copy)):
+            times = []
+            for i in range(args.repeat):
+                out_ws = make_sink()
+
+                # like timeit, keep the collector out of it: both loops make the same garbage
+                gc.collect()
+                gc.disable()
+                try:
+                    start = time.perf_counter()
+                    copy(in_ws, out_ws, params, in_column_map, out_column_map)
+                    times.append(time.perf_counter() - start)
+                finally:
+                    gc.enable()
+            best[name] = min(times)
+
+            print(f"{ sink_name:8s} { name:9s} { in_ws.nrows } rows  { best[name] * 1e9 / cells:7.1f} ns/cell")
+
+        speedup = best['reference'] / best['plan']
+        status = 'ok'
+        if sink_name == 'null' and args.min_speedup is not None and speedup < args.min_speedup:
+            status = f"FAIL: under { args.min_speedup }x"
+            ok = False
+        print(f"{ sink_name:8s} plan is { speedup:.2f}x the reference loop  { status }")
+
+    return ok
+
+
+def bench_save(args):
+    """ time a two sheet workbook (like the availability reports make) saved after each sheet,
+        as process_common used to, and saved once by a WorkbookBuilder
+    """
+
+    import os
+    import tempfile
+    import report_table
+    import report_workbook
+
+    in_ws = report_table.ReportTable(SyntheticSheet(args.rows))
+    titles = in_ws.row_values(0)
+    in_column_map = { title: col for col, title in enumerate(titles) }
+    out_column_map = { title: col +1 for col, title in enumerate(titles) }
+    params = copy_params()
+
+    def save_each(file_name):
+        out_wb = report_workbook.ReportWorkbook()
+        for title in ('First', 'Second'):
+            planned_copy(in_ws, out_wb.create_sheet(title=title), params, in_column_map, out_column_map)
+            out_wb.save(file_name)
+
+    def save_once(file_name):
+        out_wb = report_workbook.WorkbookBuilder(file_name)
+        for title in ('First', 'Second'):
+            planned_copy(in_ws, out_wb.create_sheet(title=title), params, in_column_map, out_column_map)
+        out_wb.flush()
+
+    best = {}
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        file_name = os.path.join(tmp_dir, 'bench.xlsx')
+
+        for name, build in (('each', save_each), ('once', save_once)):
+            times = []
+            for i in range(args.repeat):
+                gc.collect()
+                start = time.perf_counter()
+                build(file_name)
+                times.append(time.perf_counter() - start)
+            best[name] = min(times)
+
+            print(f"save { name:5s} 2 sheets x { in_ws.nrows } rows  { best[name]:.2f} s  ({ os.path.getsize(file_name) } bytes)")
+
+    print(f"saving once saves { best['each'] - best['once']:.2f} s ({ 100 * (1 - best['once'] / best['each']):.0f}%)")
+    return True
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(
+            description="timing benchmarks for the report scripts",
+            allow_abbrev=False)
+    parser.add_argument("--debug", help="turn on debugging output", action="store_true")
+    subparsers = parser.add_subparsers(required=True)
+
+    startup = subparsers.add_parser("startup", help="import time of each entry point")
+    startup.add_argument("--repeat", help="imports to time per entry point", type=int, default=5)
+    startup.add_argument("--max-ms", help="fail if the best import time is over this", type=float)
+    startup.add_argument("module", help="only check these entry points", nargs='*')
+    startup.set_defaults(func=bench_startup)
+
+    copy = subparsers.add_parser("copy", help="per-cell cost of the report copy loop")
+    copy.add_argument("--rows", help="rows in the synthetic roster", type=int, default=20000)
+    copy.add_argument("--repeat", help="runs to time for each loop", type=int, default=3)
+    copy.add_argument("--min-speedup", help="fail if the plan isn't this many times faster (null sheet)", type=float)
+    copy.set_defaults(func=bench_copy)
+
+    save = subparsers.add_parser("save", help="saving a two sheet workbook once instead of after each sheet")
+    save.add_argument("--rows", help="rows in each synthetic sheet", type=int, default=20000)
+    save.add_argument("--repeat", help="runs to time each way", type=int, default=3)
+    save.set_defaults(func=bench_save)
+
+    args = parser.parse_args()
+    return args
+
+
+if __name__ == "__main__":
+    main()
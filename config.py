@@ -1,8 +1,5 @@
 
 
-ROSTER_DIR = "."
-ROSTER_FILE = f"{ ROSTER_DIR }/staff_roster.xls"
-
 # origin 1 row of the title line in the roster file
 ROSTER_TITLE_ROW = 6
 
@@ -11,6 +8,17 @@ ROSTER_TITLE_ROW = 6
 VC_DR_ID = '2034'   # DR155-21 Gold Country Forest Fires
 DR_NAME = 'DR155-22'
 
+# to report on several DRs in one run, list the settings that differ for each one here; anything
+# not given (mail settings, timeouts, ...) comes from the top level settings in this file.  With
+# an empty list just the VC_DR_ID / DR_NAME DR above is done.
+#DRS = [
+#        { 'VC_DR_ID': '2034', 'DR_NAME': 'DR155-22', 'OUTPUT_FILE': './DR155-22 staffing.xlsx', },
+#        { 'VC_DR_ID': '1881', 'DR_NAME': 'DR767-21', 'OUTPUT_FILE': './DR767-21 staffing.xlsx',
+#            'MAIL_ADDRESS': 'dr767-21-staffing-reports@americanredcross.onmicrosoft.com',
+#            'MAIL_ARCHIVE': 'https://outlook.office.com/mail/group/americanredcross.onmicrosoft.com/dr767-21-staffing-reports/email', },
+#        ]
+DRS = []
+
 OUTPUT_DIR = "."
 OUTPUT_FILE = f"{ OUTPUT_DIR }/staffing.xlsx"
 
@@ -36,5 +44,41 @@ MAIL_BCC = 'dr155-22-test-messages@askneil.com'
 MAIL_ARCHIVE = 'https://outlook.office.com/mail/group/americanredcross.onmicrosoft.com/dr155-22-staffing-reports/email'
 DAYS_BEFORE_WARNING = 4
 
+# write output workbooks in openpyxl's write-only mode: rows are streamed to the file as they are
+# made instead of all being held in memory until the save (see report_workbook.py)
+WRITE_ONLY_OUTPUT = False
+
 COOKIE_FILE = 'cookies.txt'
+
+# a VC login is assumed good for VC_SESSION_LIFETIME seconds (or until its cookies say otherwise);
+# within VC_SESSION_REFRESH_MARGIN seconds of that, a new login is started in the background
+VC_SESSION_LIFETIME = 12 * 3600
+VC_SESSION_REFRESH_MARGIN = 2 * 3600
+
+# how to log in: 'http' posts the SSO form directly (falling back to a browser if that fails);
+# 'selenium' always uses a headless browser.  VC_LOGIN_URL is where the login starts.
+VC_LOGIN_METHOD = 'http'
+VC_LOGIN_URL = "https://volunteerconnection.redcross.org/"
+
 WEB_TIMEOUT = 60
+
+# failed report fetches are retried this many times, backing off from VC_RETRY_BACKOFF seconds
+VC_RETRIES = 2
+VC_RETRY_BACKOFF = 5
+
+# how many VC reports to download at the same time
+FETCH_WORKERS = 4
+
+# how many reports to build (parse, fill in and save the xlsx) at the same time, each in its own
+# process; 1 builds them one at a time in the main process, which is easier to debug
+PROCESS_WORKERS = 4
+
+# shared on-disk cache of raw VC reports (the same directory is used by config_avail.py)
+REPORT_CACHE_DIR = "report_cache"
+REPORT_CACHE_MAX_AGE = 15 * 60     # seconds a cached report is good for
+REPORT_CACHE_STALE_AGE = 0         # serve copies up to this old while refreshing in the background; 0 is off
+
+# highlight dates (arrivals, shifts) and short days remaining with Excel conditional formatting
+# instead of filling each cell when the report is made: the highlights then follow the day the
+# file is opened, and don't grow the file with the row count
+CONDITIONAL_FILLS = False
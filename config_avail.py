@@ -12,5 +12,43 @@ WORKFORCE_FOLDER_PATH = '/Workforce/.Archive/DO NOT DELETE - AUTO EMAIL DATA/Mai
 # lookback period for listing past DR assignments
 ASSIGNMENT_DAYS = 120
 
+# write output workbooks in openpyxl's write-only mode: rows are streamed to the file as they are
+# made instead of all being held in memory until the save (see report_workbook.py)
+WRITE_ONLY_OUTPUT = False
+
 COOKIE_FILE = 'cookies.txt'
+
+# a VC login is assumed good for VC_SESSION_LIFETIME seconds (or until its cookies say otherwise);
+# within VC_SESSION_REFRESH_MARGIN seconds of that, a new login is started in the background
+VC_SESSION_LIFETIME = 12 * 3600
+VC_SESSION_REFRESH_MARGIN = 2 * 3600
+
+# how to log in: 'http' posts the SSO form directly (falling back to a browser if that fails);
+# 'selenium' always uses a headless browser.  VC_LOGIN_URL is where the login starts.
+VC_LOGIN_METHOD = 'http'
+VC_LOGIN_URL = "https://volunteerconnection.redcross.org/"
+
 WEB_TIMEOUT = 60
+
+# failed report fetches are retried this many times, backing off from VC_RETRY_BACKOFF seconds
+VC_RETRIES = 2
+VC_RETRY_BACKOFF = 5
+
+# slow reports are launched and then polled: each poll waits at most VC_POLL_TIMEOUT seconds,
+# and polls back off from VC_POLL_INTERVAL to VC_POLL_MAX_INTERVAL seconds apart.  Reports not
+# ready after VC_REPORT_DEADLINE seconds are resumed (not relaunched) up to VC_REPORT_RESUMES times.
+VC_POLL_TIMEOUT = 20
+VC_POLL_INTERVAL = 5
+VC_POLL_MAX_INTERVAL = 60
+VC_REPORT_DEADLINE = 10 * 60
+VC_REPORT_RESUMES = 2
+
+# shared on-disk cache of raw VC reports (the same directory is used by config.py)
+REPORT_CACHE_DIR = "report_cache"
+REPORT_CACHE_MAX_AGE = 60 * 60     # seconds a cached report is good for
+REPORT_CACHE_STALE_AGE = 0         # serve copies up to this old while refreshing in the background; 0 is off
+
+# counties of residence are kept between runs in this sqlite file (see member_index.py); the
+# Active Positions report is only read again once the index is MEMBER_INDEX_MAX_AGE seconds old
+MEMBER_INDEX_FILE = "member_index.sqlite"
+MEMBER_INDEX_MAX_AGE = 24 * 3600
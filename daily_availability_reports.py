@@ -16,28 +16,21 @@ import csv
 import sys
 import random
 
-import requests
-import requests_html
 import dotenv
-import xlrd
 import openpyxl
 
-from http.cookiejar import LWPCookieJar, Cookie
-
-import http.client
-#http.client.HTTPConnection.debuglevel = 1
-
-
-from selenium import webdriver
-from selenium.webdriver.common.keys import Keys
-from selenium.webdriver.common.by import By
-from selenium.webdriver.support.ui import WebDriverWait
-from selenium.webdriver.support import expected_conditions as EC
-
-import O365
+# O365 and the VC client (requests, selenium) are imported in main() only when they are needed:
+# they dominate startup time, and runs without --pull never touch VC at all
 
 import init_logging
-from vc_session import get_session
+import report_cache
+import workbook_registry
+import excel_dates
+import sheet_plan
+import report_styles
+import member_index
+import grouped_reports
+import report_workbook
 log = logging.getLogger(__name__)
 import config_avail as config_static
 
@@ -51,6 +44,7 @@ def main():
     config = init_config()
 
     # initialize office 365 graph api
+    import O365
     credentials = (config.CLIENT_ID, config.CLIENT_SECRET)
 
     scopes = [
@@ -80,49 +74,32 @@ def main():
             sys.exit(1)
 
 
-    # initialize volunteer connection api
-    session = get_session(config)
+    # initialize volunteer connection api (not needed if we're only reading the report cache)
+    client = None
+    if args.pull:
+        import vc_client
+        import vc_session
+        client = vc_client.VCClient(vc_session.get_session(config), config)
+
     results = {
             'files': [],
             }
 
-    if args.pull:
-        xls0_buffer = read_active_positions(session, config)
-        with open('test_active_positions.xls', 'w+b') as fh:
-            fh.write(xls0_buffer)
+    # without --pull, use whatever copies of the reports are in the report cache.  The county
+    # index is kept between runs; only pull Active Positions again once it's gone stale
+    if member_index.is_fresh(config.MEMBER_INDEX_FILE, config.MEMBER_INDEX_MAX_AGE):
+        log.debug(f"member index { config.MEMBER_INDEX_FILE } is fresh; not reading active positions")
+        results['county_lookup'] = member_index.load(config.MEMBER_INDEX_FILE)
     else:
-        with open('test_active_positions.xls', 'rb') as fh:
-            xls0_buffer = fh.read()
-    process_active_positions(results, xls0_buffer)
+        process_active_positions(results, config, read_active_positions(client, config, args))
 
-    if args.pull:
-        xls0_buffer = read_all_assignments(session, config)
-        xls1_buffer = read_current_assignments(session, config)
-        with open('test_all_assignments.xls', 'w+b') as fh:
-            fh.write(xls0_buffer)
-        with open('test_current_assignments.xls', 'w+b') as fh:
-            fh.write(xls1_buffer)
-
-    else:
-        with open('test_all_assignments.xls', 'rb') as fh:
-            xls0_buffer = fh.read()
-        with open('test_current_assignments.xls', 'rb') as fh:
-            xls1_buffer = fh.read()
-    process_all_assignments(results, config, xls0_buffer, xls1_buffer)
+    process_all_assignments(results, config,
+            read_all_assignments(client, config, args),
+            read_current_assignments(client, config, args))
 
-    if args.pull:
-        xls0_buffer = read_responder_availability(session, config)
-        xls1_buffer = read_match_open(session, config)
-        with open('test_avail.xls', 'w+b') as fh:
-            fh.write(xls0_buffer)
-        with open('test_match_open.xls', 'w+b') as fh:
-            fh.write(xls1_buffer)
-    else:
-        with open('test_avail.xls', 'rb') as fh:
-            xls0_buffer = fh.read()
-        with open('test_match_open.xls', 'rb') as fh:
-            xls1_buffer = fh.read()
-    process_availability(results, xls0_buffer, xls1_buffer)
+    availability_file, match_open_file = read_slow_reports(client, config, args,
+            [ responder_availability_params, match_open_params ])
+    process_availability(results, config, availability_file, match_open_file)
 
     if not args.post:
         return
@@ -185,19 +162,16 @@ f"""<html>
 ORDINAL_1900_01_01 = datetime.datetime(1900, 1, 1).toordinal()
 TODAY = datetime.date.today()
 TIMESTAMP = datetime.datetime.now().strftime('%Y-%m-%d %H%M')
-LEFT_ALIGN = openpyxl.styles.Alignment(horizontal='left')
+LEFT_ALIGN = report_styles.LEFT_ALIGN
 
 
-def process_availability(results, contents_responder_availability, contents_match_open):
+def process_availability(results, config, responder_availability_file, match_open_file):
 
-    title_font = openpyxl.styles.Font(name='Arial', size=14, bold=True)
     def pre_fixup(in_ws, out_ws, title):
-        nonlocal title_font
-
         # copy the title values
         out_ws['A1'] = "NCCR Responder Availability"
 
-        out_ws['a1'].font = title_font
+        out_ws['a1'].font = report_styles.TITLE_FONT
 
     row_gap_type = None
     row_mem_num = None
@@ -266,31 +240,28 @@ def process_availability(results, contents_responder_availability, contents_matc
 
         cell.value = county
 
-    re_date_convert = re.compile(r'(\d\d?)/(\d\d?)/(\d\d)')
     def fill_date_convert(cell):
         val = cell.value
         if isinstance(val, str):
             #log.debug(f"looking at val '{ val }'")
-            match = re_date_convert.match(val)
-            if match != None:
-                dt = datetime.datetime(2000 + int(match.group(3)), int(match.group(1)), int(match.group(2)))
-                #log.debug(f"converted date from '{ val }' to '{ val2 }' / { dt.strftime('%Y-%m-%d') }")
+            # the same few dates fill these columns; parse_short_date remembers each one
+            dt = excel_dates.parse_short_date(val)
+            if dt != None:
                 cell.value = dt
-                cell.number_format = 'yyyy-mm-dd'
+                report_styles.add(cell, number_format='yyyy-mm-dd')
 
-    red_font = openpyxl.styles.Font(color='FFFF0000')
     def column_color(cell, in_color_index):
         """ look for in_color_index of 2 (red) and color output cell to match """
 
         if in_color_index == 2:
             #log.debug(f"saw red input cell for output { cell.coordinate }")
-            cell.font = red_font
+            report_styles.add(cell, font=report_styles.RED_FONT)
 
     def hyperlink_convert(cell, url):
         """ convert a hyperlink to output """
         #log.debug(f"saw hyperlink for output cell { cell.coordinate }")
         cell.hyperlink = url
-        cell.style = 'Hyperlink'
+        report_styles.apply(cell, 'Hyperlink')
 
     params = {
             'sheet_name':  'Availability',
@@ -353,7 +324,10 @@ def process_availability(results, contents_responder_availability, contents_matc
             }
 
     results['files'].append(params['out_file_name'])
-    out_wb = process_common(contents_responder_availability, params)
+
+    # both sheets go in one file, which is written once, after the second sheet
+    out_wb = report_workbook.WorkbookBuilder(params['out_file_name'], write_only=config.WRITE_ONLY_OUTPUT)
+    process_common(responder_availability_file, params, out_wb=out_wb)
 
     params2 = {
             'sheet_name': 'Open Positions',
@@ -408,134 +382,45 @@ def process_availability(results, contents_responder_availability, contents_matc
                     },
             }
 
-    out_wb = process_common(contents_match_open, params2, out_wb=out_wb)
+    process_common(match_open_file, params2, out_wb=out_wb)
+    out_wb.flush()
 
 
 
-def process_all_assignments(results, config, contents_all_assignments, contents_current_assignments):
+def process_all_assignments(results, config, all_assignments_file, current_assignments_file):
     """ process the all assignments spreadsheet """
 
-    fill_today = openpyxl.styles.PatternFill(fgColor='C9E2B8', fill_type='solid')
-    fill_tomorrow = openpyxl.styles.PatternFill(fgColor='9BC2E6', fill_type='solid')
-    fill_past = openpyxl.styles.PatternFill(fgColor='FFDB69', fill_type='solid')
-
     results['arrive_today'] = 0
     results['arrive_tomorrow'] = 0
 
-    last_row = False
-    dro_name = None
-    dro_number = None
-    member_number = None
-    member_name = None
-
-    dro_name_split = re.compile(r'(\d+-\d+) (.*)')
-    def parse_dro(number, name):
-        """ the current sheet encodes the dro name in the dro number field; split it out """
-        nonlocal dro_name_split
-
-        if name == '':
-
-            match = dro_name_split.match(number)
-            if match != None:
-                number = match.group(1)
-                name = match.group(2)
-
-        return (number, name)
-
     def pre_fixup(in_ws, out_ws, a1_value):
-        nonlocal dro_name
-        nonlocal dro_number
-
         # copy the title values
         out_ws['A1'] = a1_value
 
-        title_font = openpyxl.styles.Font(name='Arial', size=14, bold=True)
-        out_ws['a1'].font = title_font
-
-        dro_number = in_ws.cell_value(4,0)
-        dro_name = in_ws.cell_value(4,1)
-
-    def row_filter(row, column_dict, pass_type):
-        """ filter out all title rows but the first one """
-        nonlocal last_row
-        nonlocal dro_name
-        nonlocal dro_number
-        nonlocal member_number
-        nonlocal member_name
-
-        if pass_type == 'all':
-            last_row_val = 'People Assigned by DRO'
-            mem_num_col_name = 'Mem#'
-            col0_name = 'Mem#'
-            col1_name = 'Name'
-            col2_name = 'Chapter'
-        elif pass_type == 'current':
-            last_row_val = 'Region:'
-            mem_num_col_name = 'Mem #'
-            col0_name = 'Region'
-            col1_name = 'Mem #'
-            col2_name = 'Name'
-        else:
-            raise Exception(f"unknown pass_type '{ pass_type }'")
-
-        if last_row:
-            return False
-
-        if row[0] == last_row_val:
-            last_row = True
-            return False
-
-        mem_num = row[column_dict[mem_num_col_name]]
-        member_name = row[column_dict['Name']]
-        col0 = row[column_dict[col0_name]]
-        col1 = row[column_dict[col1_name]]
-        col2 = row[column_dict[col2_name]]
-        #log.debug(f"row_filter: col0 '{ col0 }' col1 '{ col1 }' col2 '{ col2 }'")
-        
-        # filter out all other title rows
-        if col2 == col2_name:
-            return False
-
-        if col0 == '' and col1 == '':
-            # blank line
-            return False
-
-        if col2 == '':
-            dro_number, dro_name = parse_dro(col0, col1)
-            #log.debug(f"Capturing dro_number '{ dro_number }' dro_name '{ dro_name }'")
-            return False
-
-        # just a normal row: process it
-        if isinstance(mem_num, (int, float)):
-            member_number = int(mem_num)
-            #log.debug(f"stashing member_number { member_number }")
-        return True
-
-    def fill_dro_name(cell):
-        nonlocal dro_name
-        cell.value = dro_name
-
-    def fill_dro_number(cell):
-        nonlocal dro_number
-        cell.value = dro_number
+        out_ws['a1'].font = report_styles.TITLE_FONT
 
     if 'county_lookup' in results:
         county_lookup = results['county_lookup']
     else:
         county_lookup = {}
 
-    def fill_county(cell):
-        nonlocal county_lookup
-        nonlocal member_number
+    def assignment_params(params, report):
+        """ point params at the flattened report: its rows, and the DR and county of each """
 
-        if member_number != None and member_number in county_lookup:
-            county = county_lookup[member_number]['county']
-            #log.debug(f"looked up member { member_number } / { member_name } county { county } / { county_lookup[member_number] }")
-        else:
-            log.debug(f"looked up member { member_number } / { member_name }: county is not in dict")
-            county = 'unknown'
+        counties = []
+        for member, name in zip(report.members, report.names):
+            if member != None and member in county_lookup:
+                counties.append(county_lookup[member]['county'])
+            else:
+                log.debug(f"looked up member { member } / { name }: county is not in dict")
+                counties.append('unknown')
 
-        cell.value = county
+        params['rows'] = report.rows
+        params['column_values'] = {
+                'DR Number': report.by_row(report.dr_numbers),
+                'DR Name': report.by_row(report.dr_names),
+                'County': report.by_row(counties),
+                }
 
     params = {
             'sheet_name': 'All Assignments by DR',
@@ -565,13 +450,7 @@ def process_all_assignments(results, config, contents_all_assignments, contents_
                     'Assign': LEFT_ALIGN,
                     'Release': LEFT_ALIGN,
                     },
-            'column_fills': {
-                    'DR Number': fill_dro_number,
-                    'DR Name': fill_dro_name,
-                    'County': fill_county,
-                    },
             'pre_fixup': lambda in_ws, out_ws: pre_fixup(in_ws, out_ws, f"All DR Assignments by DR in the last { config.ASSIGNMENT_DAYS } days"),
-            'row_filter': lambda row, col_dict: row_filter(row, col_dict, 'all'),
             'insert_columns': {
                 'DR Name': 'Chapter',
                 'DR Number': 'DR Name',
@@ -580,8 +459,14 @@ def process_all_assignments(results, config, contents_all_assignments, contents_
             'freeze_panes': 'C3',
             }
 
+    # flatten the DR sections into one record per assignment, then write those rows out
+    assignment_params(params, grouped_reports.read_report(all_assignments_file, 'all'))
+
     results['files'].append(params['out_file_name'])
-    out_wb = process_common(contents_all_assignments, params)
+
+    # both sheets go in one file, which is written once, after the second sheet
+    out_wb = report_workbook.WorkbookBuilder(params['out_file_name'], write_only=config.WRITE_ONLY_OUTPUT)
+    process_common(all_assignments_file, params, out_wb=out_wb)
 
     params['sheet_name'] = 'Current Assignments'
     params['table_name'] = 'CurrentAssignments'
@@ -611,116 +496,52 @@ def process_all_assignments(results, config, contents_all_assignments, contents_
                 'Home phone': 13,
             }
     params['pre_fixup'] =  lambda in_ws, out_ws: pre_fixup(in_ws, out_ws, 'Currently assigned to a DR')
-    params['row_filter'] =  lambda row, col_dict: row_filter(row, col_dict, 'current')
     params['freeze_panes'] = 'D3'
 
-    last_row = False
-    out_wb = process_common(contents_current_assignments, params, out_wb=out_wb)
-
+    assignment_params(params, grouped_reports.read_report(current_assignments_file, 'current'))
+    process_common(current_assignments_file, params, out_wb=out_wb)
+    out_wb.flush()
 
 
-def process_active_positions(results, contents):
-    """ scan the contents xls file.  Pick out county.  index by member id """
 
-    def get_row_value(row, column_map, row_title):
-        # the row_title should always be in the column map...
-        column = column_map[row_title]
+def process_active_positions(results, config, report_file):
+    """ scan the active positions xls file.  Pick out county.  index by member id
 
-        value = row[column]
-        return value
+        The counties go into the persistent member index (see member_index); only members whose
+        rows changed since the last run are parsed again.
+    """
 
-    in_wb = xlrd.open_workbook(file_contents=contents)
-    in_ws = in_wb.sheet_by_index(0)
-
-    in_starting_row = 5
-    delete_columns = []
-    in_column_map, out_column_map = process_title_row(in_ws.row_values(in_starting_row), delete_columns)
-
-    #log.debug(f"in_column_map: { in_column_map }")
-
-    num_rows = in_ws.nrows - in_starting_row -1
-    z_county_re = re.compile(r'Z County: (.*)')
-    county_re = re.compile(r' County$')
-
-    log.debug(f"num_rows { num_rows }")
-    last_member_num = None
-    z_county = None
-    start_row = None
-    result_dict = {}
-    for index in range(num_rows +1):
-        # read the row from the sheet
-
-        if index >= num_rows:
-            # we're past the last row
-            member_num = None
-        else:
-            #log.debug(f"num_rows { num_rows } index { index } in_starting_row { in_starting_row }")
-            in_row = in_ws.row_values(index + in_starting_row + 1)
-            in_val = get_row_value(in_row, in_column_map, 'Member #')
-            if in_val != '':
-                member_num = int(in_val)
-            else:
-                member_num = 0
-
-        if member_num != last_member_num:
-            # this row is a new person; remember the id
-
-
-            if last_member_num != None:
-                # we're switching people
-
-                if z_county != None:
-                    county = z_county
-
-                member_entry = {
-                        'member_num': last_member_num,
-                        'name': name,
-                        'county': county,
-                        'z-county': z_county,
-                        'row-num': start_row,
-                        }
-                if county != '':
-                    #log.debug(f"adding entry: member_num { member_num} to { member_entry }")
-                    result_dict[last_member_num] = member_entry
-                else:
-                    #log.debug(f"empty county member_num { member_num} to { member_entry }")
-                    pass
-
-            # read out the cells we care about
-            name = get_row_value(in_row, in_column_map, 'Account Name (hyperlink)')
-            position = get_row_value(in_row, in_column_map, 'Position Name')
-            county = get_row_value(in_row, in_column_map, 'County of Residence')
-            county = county_re.sub('', county)
-
-            z_county = None
-            last_member_num = member_num
-            start_row = index + in_starting_row + 2
-        else:
-            pass
+    index_file = config.MEMBER_INDEX_FILE
 
-        z_county_match = z_county_re.match(position)
-        if z_county_match != None:
-            z_county = z_county_match.group(1)
+    in_ws = workbook_registry.get_table(report_file)
+    member_index.update(index_file, in_ws, workbook_registry.content_hash(report_file))
 
-        #if index > 100:
-        #    break
+    results['county_lookup'] = member_index.load(index_file)
 
-    #log.debug(f"result_dict: { pprint.pformat(result_dict, indent=2) }")
-    results['county_lookup'] = result_dict
 
 
+def process_common(report_file, params, out_wb=None):
+    """ common code to process all sheets
 
-def process_common(contents, params, out_wb=None):
-    """ common code to process all sheets """
+        out_wb - a report_workbook.WorkbookBuilder to add the sheet to; the caller flushes it
+                once all its sheets are done.  If None, the sheet goes in a workbook of its own,
+                saved to params['out_file_name'] straight away
+    """
     
     in_starting_row = params['in_starting_row']
     out_starting_row = params['out_starting_row']
 
-    in_wb = xlrd.open_workbook(file_contents=contents, formatting_info=True)
-    in_ws = in_wb.sheet_by_index(0)
+    # the formatting parse is slow: only do it if we need font colours or hyperlinks
+    needs_formatting = len(params.get('column_colors', {})) > 0 or len(params.get('hyperlink_convert', {})) > 0
+    in_ws = workbook_registry.get_table(report_file, formatting_info=needs_formatting)
 
-    if out_wb == None:
-        out_wb = openpyxl.Workbook()
+    # row filters may rewrite cells; don't let that leak into the shared parsed report
+    if 'row_filter' in params:
+        in_ws = in_ws.copy()
+
+    flush = out_wb == None
+    if flush:
+        out_wb = report_workbook.WorkbookBuilder(params['out_file_name'])
 
     out_ws = out_wb.create_sheet(title=params['sheet_name'])
 
@@ -755,111 +576,63 @@ def process_common(contents, params, out_wb=None):
         #log.debug(f"out_column_map after inserts: { out_column_map }")
 
 
-    col_format = {}
-    if 'column_formats' in params:
-        for col_name, cell_format in params['column_formats'].items():
-            col_format[col_name] = cell_format
-
     if 'column_widths' in params:
         for col_name, col_width in params['column_widths'].items():
             col_index = out_column_map[col_name]
             col_letter = openpyxl.utils.cell.get_column_letter(col_index)
             out_ws.column_dimensions[col_letter].width = col_width
 
-    col_alignment = {}
-    if 'column_alignments' in params:
-        for col_name, alignment in params['column_alignments'].items():
-            col_alignment[col_name] = alignment
+    col_colors = params.get('column_colors', {})
+    col_hyperlink = params.get('hyperlink_convert', {})
 
-    col_fills = {}
-    if 'column_fills' in params:
-        for col_name, func in params['column_fills'].items():
-            col_fills[col_name] = func
+    # pull out the formatting we need once, a column at a time, before the copy
+    in_colours = {}
+    for col_name in col_colors:
+        if col_name in in_column_map:
+            in_colours[col_name] = in_ws.font_colours(in_column_map[col_name])
 
-    col_colors = {}
-    if 'column_colors' in params:
-        for col_name, func in params['column_colors'].items():
-            col_colors[col_name] = func
+    link_cols = { col_name: in_column_map[col_name] for col_name in col_hyperlink if col_name in in_column_map }
+    in_links = {}
+    if len(link_cols) > 0:
+        links = in_ws.hyperlinks(link_cols.values())
+        for col_name, in_col_index in link_cols.items():
+            in_links[col_name] = links[in_col_index]
 
-    col_hyperlink = {}
-    if 'hyperlink_convert' in params:
-        for col_name, func in params['hyperlink_convert'].items():
-            col_hyperlink[col_name] = func
+    # work out what each column needs once, rather than looking it up for every cell; each
+    # column's formatting becomes a named style in the output workbook
+    styles = report_styles.registry(out_ws.parent)
+    plan = sheet_plan.compile_plan(in_ws.columns, in_column_map, out_column_map, params, in_colours, in_links, styles=styles)
 
     # now deal with the body of the message
     num_rows = in_ws.nrows - in_starting_row
-    row_filter = lambda x, y: True
-    if 'row_filter' in params:
-        log.debug("row filter is set")
-        row_filter = params['row_filter']
-
     log.debug(f"num_rows { num_rows }")
-    out_index = out_starting_row -1
-    seen_xf = {}
-    seen_font = {}
-    for index in range(num_rows):
-        in_row_index = index + in_starting_row
-        in_row = in_ws.row_values(in_row_index)
-
-        # allow us to ignore rows
-        if index > 0 and not row_filter(in_row, in_column_map):
-            #log.debug(f"ignoring row { index }")
-            continue
-
-        out_index += 1
-
-        for col_name, out_col in out_column_map.items():
-            if col_name in in_column_map:
-                in_col_index = in_column_map[col_name]
-                in_value = in_row[in_col_index]
-            else:
-                in_col_index = None
-                in_value = ''
-
-            if index == 0:
-                in_value = col_name
-            cell = out_ws.cell(row=out_index, column=out_col, value=in_value)
-
-            if index > 0:
-                if col_name in col_format:
-                    # handle special column formats
-                    cell.number_format = col_format[col_name]
-
-                if col_name in col_fills:
-                    col_fills[col_name](cell)
-
-                if col_name in col_colors and in_col_index != None:
-                    xf_index = in_ws.cell_xf_index(in_row_index, in_col_index)
-
-                    if xf_index not in seen_xf:
-                        xf = in_wb.xf_list[xf_index]
-                        #log.debug(f"col_colors: cell row { in_row_index } col { in_col_index } xf_index { xf_index } xf\n{ xf.dump(indent=2) }\n\n")
-
-                        font_index = xf.font_index
-                        font = in_wb.font_list[font_index]
-                        colour_index = font.colour_index
-
-                        seen_xf[xf_index] = colour_index
-                        #log.debug(f"new colour: cell row { in_row_index } col { in_col_index } font_index { font_index } colour { colour_index }")
-
-                    col_colors[col_name](cell, seen_xf[xf_index])
-
-                if col_name in col_hyperlink and in_col_index != None:
-                    hyperlink = in_ws.hyperlink_map.get((in_row_index, in_col_index))
-                    if hyperlink != None:
-                        if hyperlink.type == 'url':
-                            #log.debug(f"in cell { in_row_index },{in_col_index} hyperlink { hyperlink }")
-                            #hyperlink.dump(indent=2)
-                            col_hyperlink[col_name](cell, hyperlink.url_or_path)
+    sheet_plan.write_title_row(out_ws, out_starting_row, plan)
 
+    if 'rows' in params:
+        # the caller has already picked the body rows
+        in_rows = params['rows']
+    else:
+        row_filter = lambda x, y: True
+        if 'row_filter' in params:
+            log.debug("row filter is set")
+            row_filter = params['row_filter']
 
-            if col_name in col_alignment:
-                cell.alignment = col_alignment[col_name]
+        # allow us to ignore rows
+        in_rows = ( index for index in range(in_starting_row +1, in_ws.nrows)
+                if row_filter(in_ws.row(index), in_column_map) )
 
-    # do some ws dependent table fixup after the copy
+    # do some ws dependent fixup of the titles.  The fixups only touch the header rows (and
+    # freeze panes), so they run before the body; a streamed sheet can't go back to them later
     if 'post_fixup' in params:
         params['post_fixup'](out_ws)
 
+    if 'freeze_panes' in params:
+        freeze_panes = params['freeze_panes']
+        log.debug(f"setting freeze_panes to cell '{ freeze_panes }'")
+        out_ws.freeze_panes = freeze_panes
+
+    report_workbook.start_body(out_ws)
+    sheet_plan.write_rows(out_ws, out_starting_row +1, plan, in_rows, styles)
 
     # now make a table of the data
     start_col = 'A'
@@ -869,22 +642,14 @@ def process_common(contents, params, out_wb=None):
     table = openpyxl.worksheet.table.Table(displayName=params['table_name'], ref=table_ref)
     out_ws.add_table(table)
 
-    if 'freeze_panes' in params:
-        freeze_panes = params['freeze_panes']
-        log.debug(f"setting freeze_panes to cell '{ freeze_panes }'")
-        out_ws.freeze_panes = out_ws[freeze_panes]
-
-    default_sheet_name = 'Sheet'
-    if default_sheet_name in out_wb:
-        del out_wb[default_sheet_name]
-
-    out_wb.save(params['out_file_name'])
+    if flush:
+        out_wb.flush()
 
     return out_wb
 
 
 def process_title_row(row, delete_columns):
-    """ process an xlrd title row, returning a map of column names to column indexes (origin zero) """
+    """ process a title row, returning a map of column names to column indexes (origin zero) """
     in_column_map = {}
     out_column_map = {}
     out_col = 0
@@ -899,8 +664,8 @@ def process_title_row(row, delete_columns):
 
     return in_column_map, out_column_map
 
-def read_match_open(session, config):
-    """ run the Disaster Responder Availability Match Open Positions report """
+def match_open_params(config):
+    """ params for the Disaster Responder Availability Match Open Positions report """
 
     params0 = {
             'query_id': '1972837',
@@ -927,15 +692,14 @@ def read_match_open(session, config):
             'run': 'Run',
             }
 
-    # give an extra-long timeout, since the report is slow
     params1 = convert_params(params0)
 
     log.debug(f"params1:\n{ pprint.pformat(params1, indent=2) }")
 
-    return read_common(session, config, params0, params1, timeout=config.WEB_TIMEOUT + 60)
+    return params0, params1
 
-def read_responder_availability(session, config):
-    """ run the Distaster Responder Availability by GAP report """
+def responder_availability_params(config):
+    """ params for the Distaster Responder Availability by GAP report """
 
     params0 = {
             'query_id': '1803665',
@@ -1036,15 +800,47 @@ def read_responder_availability(session, config):
             'run': 'Run',
             }
 
-    # give an extra-long timeout, since the report is slow
     params1 = convert_params(params0)
 
     log.debug(f"params1:\n{ pprint.pformat(params1, indent=2) }")
 
-    return read_common(session, config, params0, params1, timeout=config.WEB_TIMEOUT + 60)
+    return params0, params1
+
+
+def read_slow_reports(client, config, args, param_funcs):
+    """ run the slow availability reports side by side
+
+        Rather than block on one long request per report, launch them all and poll VC until
+        they're ready (see VCClient.poll_reports).  If they aren't ready by the deadline, the
+        same jobs are resumed up to config.VC_REPORT_RESUMES times before giving up.
+
+        param_funcs - functions of config returning (params0, params1) for each report
+        returns the report file paths, in param_funcs order
+    """
 
+    param_list = [ func(config) for func in param_funcs ]
+    params1_by_query = { params0['query_id']: params1 for params0, params1 in param_list }
 
-def read_all_assignments(session, config):
+    def download_many(pairs):
+        import vc_client
+        requests_list = [ (params0, params1_by_query[params0['query_id']], fh) for params0, fh in pairs ]
+
+        resumes = 0
+        while True:
+            try:
+                client.poll_reports(requests_list, extra_headers=vc_client.NAVIGATE_HEADERS)
+                return
+            except vc_client.ReportTimeout as e:
+                if resumes >= config.VC_REPORT_RESUMES:
+                    raise
+                resumes += 1
+                log.warning(f"{ e }; resuming ({ resumes } of { config.VC_REPORT_RESUMES })")
+
+    params0_list = [ params0 for params0, params1 in param_list ]
+    return report_cache.get_reports(config, params0_list, download_many, offline=not args.pull)
+
+
+def read_all_assignments(client, config, args):
     """ run the All Assignments By DR and/or Date Range report """
 
     dt_days = datetime.datetime.now() - datetime.timedelta(days=config.ASSIGNMENT_DAYS)
@@ -1069,10 +865,10 @@ def read_all_assignments(session, config):
 
     #log.debug(f"params1:\n{ pprint.pformat(params1, indent=2) }")
 
-    return read_common(session, config, params0, params1)
+    return read_common(client, config, args, params0, params1)
 
 
-def read_current_assignments(session, config):
+def read_current_assignments(client, config, args):
     """ run the Disaster Responders Currently Assigned - Region report """
 
     params0 = {
@@ -1086,10 +882,10 @@ def read_current_assignments(session, config):
 
     params1 = convert_params(params0)
 
-    return read_common(session, config, params0, params1)
+    return read_common(client, config, args, params0, params1)
 
 
-def read_active_positions(session, config):
+def read_active_positions(client, config, args):
 
 
     params0 = {
@@ -1109,7 +905,8 @@ def read_active_positions(session, config):
 
     log.debug(f"params1:\n{ pprint.pformat(params1, indent=2) }")
 
-    return read_common(session, config, params0, params1)
+    # counties of residence hardly ever change; a copy is good for as long as the index made from it
+    return read_common(client, config, args, params0, params1, max_age=config.MEMBER_INDEX_MAX_AGE)
 
 
 def convert_date(dt):
@@ -1167,53 +964,19 @@ def convert_params(params0):
     return params1
 
 
-def read_common(session, config, params0, params1, timeout=None):
-
-    if timeout == None:
-        timeout = config.WEB_TIMEOUT
-
-
-    url = "https://volunteerconnection.redcross.org/"
-
-    headers = {
-            #'accept': 'application/json, text/javascript, */*; q=0.01',
-            'accept': '*/*',
-            'accept-language': 'en-US,en;q=0.9',
-            'content-type': 'application/x-www-form-urlencoded; charset=UTF-8',
-            'DNT': '1',
-            'Host': 'volunteerconnection.redcross.org',
-            'Origin': 'https://volunteerconnection.redcross.org',
-            'Referer': 'https://volunteerconnection.redcross.org/',
-            #'Sec-Fetch-Dest': 'empty',
-            #'Sec-Fetch-Mode': 'cors',
-            'Sec-Fetch-Dest': 'document',
-            'Sec-Fetch-Mode': 'navigate',
-            'Sec-Fetch-Site': 'same-origin',
-            'sec-gpc': '1',
-            'User-Agent': '.Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/86.0.4240.75 Safari/537.36',
-            'X-Requested-With': 'XMLHttpRequest',
-            }
-    response = session.post(url, data=params0, headers=headers, timeout=timeout)
-    response.raise_for_status()
-
-
-    response = session.post(url, data=params1, headers=headers, timeout=timeout)
-    response.raise_for_status()
-
-    #log.debug(f"response.content { response.content }")
-    anchor = response.html.find('a', first=True)
-    href = anchor.attrs['href']
+def read_common(client, config, args, params0, params1, timeout=None, max_age=None):
+    """ return the path of a report's file, going through the shared report cache
 
-    url2 = url + href
+        without --pull whatever copy is in the cache is used, however old it is
+    """
 
-    #log.debug(f"url2 { url2 }")
-    response = session.get(url2, timeout=timeout)
-    response.raise_for_status()
+    offline = not args.pull
+    def download(fh):
+        import vc_client
+        client.download_report(params0, params1, fh, timeout=timeout, extra_headers=vc_client.NAVIGATE_HEADERS)
 
-    log.debug(f"retrieved document.  size is { len(response.text) }, type is '{ response.headers.get('content-type') }'")
-    #log.debug(f"document: { response.content }")
+    return report_cache.get_report(config, params0, download, max_age=max_age, offline=offline)
 
-    return response.content
 
 def init_config():
     class AttrDict(dict):
@@ -1242,7 +1005,7 @@ def parse_args():
             allow_abbrev=False)
     parser.add_argument("--debug", help="turn on debugging output", action="store_true")
     parser.add_argument("--post", help="post to real recipients", action="store_true")
-    parser.add_argument("--pull", help="read real data from VC", action="store_true")
+    parser.add_argument("--pull", help="read real data from VC (or the report cache, if fresh)", action="store_true")
 
     args = parser.parse_args()
     return args
@@ -14,27 +14,26 @@ import json
 import io
 import csv
 import sys
+import heapq
 import random
+import array
+import concurrent.futures
+import multiprocessing
 
-import requests
-import requests_html
 import dotenv
-import xlrd
 import openpyxl
 
-from http.cookiejar import LWPCookieJar, Cookie
-
-
-from selenium import webdriver
-from selenium.webdriver.common.keys import Keys
-from selenium.webdriver.common.by import By
-from selenium.webdriver.support.ui import WebDriverWait
-from selenium.webdriver.support import expected_conditions as EC
-
-import O365
+# O365 and the VC client (requests, selenium) are imported in main() only when they are needed:
+# they dominate startup time, and --cached-input runs never touch VC at all
 
 import init_logging
-from vc_session import get_session
+import vc_fetch
+import report_cache
+import workbook_registry
+import excel_dates
+import sheet_plan
+import report_styles
+import report_workbook
 log = logging.getLogger(__name__)
 import config as config_static
 
@@ -45,10 +44,10 @@ def main():
         logging.getLogger().setLevel(logging.DEBUG)
     log.debug("running...")
 
-    global config
     config = init_config()
 
     # initialize office 365 graph api
+    import O365
     credentials = (config.CLIENT_ID, config.CLIENT_SECRET)
 
     scopes = [
@@ -76,19 +75,117 @@ def main():
             sys.exit(1)
 
 
-    # initialize volunteer connection api
-    session = get_session(config)
-    results = {
-            'files': [],
+    # initialize volunteer connection api (not needed if we're only reading the report cache)
+    client = None
+    if not args.cached_input:
+        import vc_client
+        import vc_session
+        client = vc_client.VCClient(vc_session.get_session(config), config, pool_size=config.FETCH_WORKERS)
+
+    # one set of reports (and one message) per DR; every DR shares the session and the account
+    drs = dr_configs(config)
+
+    # each report is processed as soon as it arrives; the rest keep downloading meanwhile
+    stages = {
+            'arrival_roster':     (read_arrival_roster,     process_arrival_roster),
+            'open_requests':      (read_open_requests,      process_open_requests),
+            'staff_roster':       (read_staff_roster,       process_staff_roster),
+            'air_travel_roster':  (read_air_travel_roster,  process_air_travel_roster),
+            #'shift_tool':        (read_shift_tool,         process_shift_tool),
             }
 
-    process_arrival_roster(results, read_arrival_roster(session, config, args))
-    process_open_requests(results, read_open_requests(session, config, args))
-    process_staff_roster(results, read_staff_roster(session, config, args))
-    process_air_travel_roster(results, read_air_travel_roster(session, config, args))
-    #process_shift_tool(results, read_shift_tool(session, config, args))
+    # all the DRs' reports go into one fetch pool, so an extra DR is just a few more downloads
+    fetch_jobs = {}
+    for dr_index, dr_config in enumerate(drs):
+        for name, (read_func, process_func) in stages.items():
+            fetch_jobs[(dr_index, name)] = lambda dr_config=dr_config, read_func=read_func: read_func(client, dr_config, args)
+
+    # each report is built in a worker process: they only share their config, and each sends
+    # back its own results (output files and summary counts) to be merged into its DR's
+    dr_results = [ { 'files': [] } for dr_config in drs ]
+    with report_executor(config.PROCESS_WORKERS) as executor:
+        pending = []
+        for (dr_index, name), report_file in vc_fetch.fetch_reports(fetch_jobs, max_workers=config.FETCH_WORKERS):
+            future = executor.submit(run_stage, stages[name][1], drs[dr_index], report_file)
+            pending.append((dr_index, future))
+
+        # merge in the order the reports arrived, as when they were built one at a time
+        for dr_index, future in pending:
+            merge_results(dr_results[dr_index], future.result())
 
     mailbox = account.mailbox()
+    for dr_config, results in zip(drs, dr_results):
+        send_reports(mailbox, dr_config, args, results)
+
+    return
+
+
+
+def run_stage(process_func, config, report_file):
+    """ build one report, returning its own results dict (files and summary counts) """
+
+    results = { 'files': [] }
+    process_func(results, config, report_file)
+    return results
+
+
+def merge_results(results, stage_results):
+    """ add one report's results from run_stage to its DR's results """
+
+    results['files'].extend(stage_results['files'])
+    for key, value in stage_results.items():
+        if key != 'files':
+            results[key] = value
+
+
+def report_executor(workers):
+    """ an executor to build reports on: a process pool, or a SerialExecutor for one worker """
+
+    if workers <= 1:
+        return SerialExecutor()
+
+    # the pool starts its workers on the first submit(), while the fetch threads are still
+    # downloading; a forked worker could start with one of their locks held, so start each
+    # worker fresh instead.  They get our dates, so every file is stamped the same
+    return concurrent.futures.ProcessPoolExecutor(max_workers=workers,
+            mp_context=multiprocessing.get_context('spawn'),
+            initializer=init_worker,
+            initargs=(TODAY, TIMESTAMP, logging.getLogger().level))
+
+
+def init_worker(today, timestamp, log_level):
+    """ set up a report worker process """
+    global TODAY, TIMESTAMP
+
+    TODAY = today
+    TIMESTAMP = timestamp
+    logging.getLogger().setLevel(log_level)
+
+
+class SerialExecutor:
+    """ just enough of an Executor to run each job in this process, as it is submitted """
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        return False
+
+    def submit(self, func, *args):
+        future = concurrent.futures.Future()
+        try:
+            future.set_result(func(*args))
+        except Exception as e:
+            future.set_exception(e)
+        return future
+
+
+
+def send_reports(mailbox, config, args, results):
+    """ mail one DR's reports (and clean up the files afterwards) """
+
+    log.debug(f"sending reports for { config.DR_NAME }")
+
     message = mailbox.new_message()
 
     #attach0_body = "attachment body\n"
@@ -177,7 +274,7 @@ If you wish to be removed from the group or have more people added: email
 </html>
 """
 
-    message.subject = f"Staff Reports { TIMESTAMP }"
+    message.subject = f"{ config.DR_NAME } Staff Reports { TIMESTAMP }"
     message.attachments.add(results['files'])
 
     if args.post or not args.save_output:
@@ -189,16 +286,13 @@ If you wish to be removed from the group or have more people added: email
         for file in results['files']:
             os.remove(file)
 
-    return
-
 
 
-ORDINAL_1900_01_01 = datetime.datetime(1900, 1, 1).toordinal()
 TODAY = datetime.date.today()
 TIMESTAMP = datetime.datetime.now().strftime('%Y-%m-%d %H%M')
-LEFT_ALIGN = openpyxl.styles.Alignment(horizontal='left')
+LEFT_ALIGN = report_styles.LEFT_ALIGN
 
-def process_air_travel_roster(results, contents):
+def process_air_travel_roster(results, config, report_file):
 
     def pre_fixup(in_ws, out_ws, params):
         # copy the title values
@@ -209,8 +303,7 @@ def process_air_travel_roster(results, contents):
         out_ws['D2'].number_format = 'yyyy-mm-dd HH:MM'
         out_ws['D2'].alignment = LEFT_ALIGN
 
-        title_font = openpyxl.styles.Font(name='Arial', size=14, bold=True)
-        out_ws['a1'].font = out_ws['d1'].font = title_font
+        out_ws['a1'].font = out_ws['d1'].font = report_styles.TITLE_FONT
 
     def post_fixup(ws):
 
@@ -254,17 +347,13 @@ def process_air_travel_roster(results, contents):
     results['files'].append(params['out_file_name'])
 
 
-    process_common(contents, params)
-
-def process_arrival_roster(results, contents):
+    process_common(report_file, params, write_only=config.WRITE_ONLY_OUTPUT)
 
-    fill_today = openpyxl.styles.PatternFill(fgColor='C9E2B8', fill_type='solid')
-    fill_tomorrow = openpyxl.styles.PatternFill(fgColor='9BC2E6', fill_type='solid')
-    fill_past = openpyxl.styles.PatternFill(fgColor='FFDB69', fill_type='solid')
+def process_arrival_roster(results, config, report_file):
 
-    results['arrive_past'] = 0
-    results['arrive_today'] = 0
-    results['arrive_tomorrow'] = 0
+    fill_today = report_styles.FILL_TODAY
+    fill_tomorrow = report_styles.FILL_TOMORROW
+    fill_past = report_styles.FILL_PAST
 
     def pre_fixup(in_ws, out_ws, params):
         # copy the title values
@@ -272,7 +361,7 @@ def process_arrival_roster(results, contents):
         out_ws['A2'] = in_ws.cell_value(1,0)
         out_ws['A3'] = in_ws.cell_value(2,0)
 
-        title_font = openpyxl.styles.Font(name='Arial', size=14, bold=True)
+        title_font = report_styles.TITLE_FONT
         out_ws['k1'].font = out_ws['k2'].font = out_ws['k3'].font = title_font
         out_ws['a1'].font = out_ws['a2'].font = out_ws['a3'].font = title_font
 
@@ -293,24 +382,8 @@ def process_arrival_roster(results, contents):
         ws.freeze_panes = 'B5'
 
 
-    def filter_arrive_date(cell, today, fill_past, fill_today, fill_tomorrow):
-        """ decide if there is a special fill to apply to the cell """
-        if cell.value == "":
-            return ""
-
-        excel_date = cell.value
-        dt = datetime.datetime.fromordinal(ORDINAL_1900_01_01 + int(excel_date) -2)
-        date = dt.date()
-
-        if date < today:
-            cell.fill = fill_past
-            results['arrive_past'] += 1
-        elif date == today:
-            cell.fill = fill_today
-            results['arrive_today'] += 1
-        elif date == datetime.timedelta(1) + today:
-            cell.fill = fill_tomorrow
-            results['arrive_tomorrow'] += 1
+    # fills by excel_dates.BUCKET_LIMITS bucket of the arrival date
+    bucket_fills = { 'past': fill_past, 'today': fill_today, 'tomorrow': fill_tomorrow }
 
     params = {
             'sheet_name': 'Arrival Roster',
@@ -340,28 +413,46 @@ def process_arrival_roster(results, contents):
                     'Flight Arrival Date/Time': LEFT_ALIGN,
                     },
             'column_fills': {
-                    'Arrive date': lambda cell: filter_arrive_date(cell, TODAY, fill_past, fill_today, fill_tomorrow),
+                    },
+            'column_row_fills': {
+                    'Arrive date': lambda values: date_fills(values, TODAY, bucket_fills),
                     },
             'pre_fixup': lambda in_ws, out_ws: pre_fixup(in_ws, out_ws, params),
             'post_fixup': post_fixup,
             }
 
+    if config.CONDITIONAL_FILLS:
+        # let Excel colour the dates against the day the file is opened
+        del params['column_row_fills']['Arrive date']
+        params['conditional_fills'] = { 'Arrive date': report_styles.bucket_rules(bucket_fills) }
+
     results['files'].append(params['out_file_name'])
 
     # wierd things happen if arrival roster is empty: the title row is one row before it should be
 
-    process_common(contents, params)
+    process_common(report_file, params, write_only=config.WRITE_ONLY_OUTPUT)
+
+    # count the arrivals by day over the whole date column at once; pre_fixup has settled
+    # which row the titles are on by now
+    in_ws = workbook_registry.get_table(report_file)
+    title_row = params['in_starting_row']
+    arrive_col = in_ws.column_index(title_row)['Arrive date']
+    offsets = excel_dates.day_offsets(in_ws.numbers(arrive_col)[title_row + 1:], TODAY)
+    counts = excel_dates.bucket_counts(offsets)
+
+    results['arrive_past'] = counts['past']
+    results['arrive_today'] = counts['today']
+    results['arrive_tomorrow'] = counts['tomorrow']
 
 
-def process_open_requests(results, contents):
+def process_open_requests(results, config, report_file):
 
     def pre_fixup(in_ws, out_ws):
         # copy the title values
         out_ws['A1'] = in_ws.cell_value(0,0)
         out_ws['E1'] = in_ws.cell_value(0,3)
 
-        title_font = openpyxl.styles.Font(name='Arial', size=14, bold=True)
-        out_ws['A1'].font = out_ws['E1'].font = title_font
+        out_ws['A1'].font = out_ws['E1'].font = report_styles.TITLE_FONT
 
 
     def post_fixup(ws):
@@ -414,15 +505,15 @@ def process_open_requests(results, contents):
             }
 
     results['files'].append(params['out_file_name'])
-    process_common(contents, params)
+    process_common(report_file, params, write_only=config.WRITE_ONLY_OUTPUT)
 
 
 gap_group_re = re.compile('^([A-Z]+)')
 
-def process_staff_roster(results, contents):
+def process_staff_roster(results, config, report_file):
     """ generate the staff roster spreadsheets """
 
-    fill_remain = openpyxl.styles.PatternFill(fgColor='FFDB69', fill_type='solid')
+    fill_remain = report_styles.FILL_DAYS_REMAIN
 
     def pre_fixup(in_ws, out_ws):
         # copy the title values
@@ -430,77 +521,43 @@ def process_staff_roster(results, contents):
         out_ws['A2'] = in_ws.cell_value(1,0)
         out_ws['A3'] = in_ws.cell_value(2,0)
 
-        title_font = openpyxl.styles.Font(name='Arial', size=14, bold=True)
+        title_font = report_styles.TITLE_FONT
         out_ws['A1'].font = out_ws['A2'].font = out_ws['A3'].font = title_font
 
-    gap_groups = {}
-    def row_filter(row, out_column_map):
-
-        released = row[out_column_map['Released']]
-        #log.debug(f"checking released: { released }")
-
-        gap = row[out_column_map['GAP(s)']]
-        match = gap_group_re.match(gap)
-        if match is not None:
-            group = match.group(1)
-            if group not in gap_groups:
-                gap_groups[group] = 1
-                log.debug(f"setting group '{ group }'")
-
-        return released == ''
-
-    def filter_days_remain(cell, today, fill_remain):
+    def filter_days_remain(cell):
+        """ make the days remaining a number """
 
-        value = cell.value
-        if value != "" and value != 'n/a':
-            value = cell.value = int(cell.value)
-            if value <= 4:
-                cell.fill = fill_remain
-
-    def filter_on_job(cell):
         value = cell.value
         if value != "" and value != 'n/a':
             cell.value = int(cell.value)
 
+    def days_remain_fills(values, fill_remain):
+        """ fill_remain for the rows with 4 or fewer days remaining, worked out for the whole column """
 
-    results['staff_total'] = 0
-    results['staff_nccr'] = 0
-    results['staff_outprocessed'] = 0
-
-    def filter_region(cell, results):
-        """ don't change anything; just count total and NCCR folks """
+        # VC gives the days as text ('n/a' if there's no end date); the title row is in here too
+        days = array.array('i', [ excel_dates.NO_DATE ]) * len(values)
+        for index, value in enumerate(values):
+            try:
+                days[index] = int(value)
+            except ValueError:
+                pass
 
-        NCCR = '05R28'
-        value = cell.value
-
-        results['staff_total'] += 1
-
-        if value == NCCR:
-            results['staff_nccr'] += 1
-
-    def filter_outprocessed(cell, results):
-        """ count total outprocessed people """
-        results['staff_outprocessed'] += 1
+        return [ fill_remain if short else None for short in excel_dates.bucket_mask(days, None, 4) ]
 
-
-    def post_fixup_staff(ws):
-
-        cell = ws['A2']
+    def filter_on_job(cell):
         value = cell.value
+        if value != "" and value != 'n/a':
+            cell.value = int(cell.value)
 
-        regex = r'\(\d+ '
-        cell.value = re.sub(regex, f"({results['staff_total']} ", value)
-        #log.debug(f"value '{value}' after '{cell.value}'")
-
-        ws.freeze_panes = "B5"
 
-    def post_fixup_outprocessed(ws):
+    def post_fixup(ws):
+        """ put the number of people on this sheet into the title """
 
         cell = ws['A2']
         value = cell.value
 
         regex = r'\(\d+ '
-        cell.value = re.sub(regex, f"({results['staff_outprocessed']} ", value)
+        cell.value = re.sub(regex, f"({ len(params['rows']) } ", value)
         #log.debug(f"value '{value}' after '{cell.value}'")
 
         ws.freeze_panes = "B5"
@@ -550,49 +607,104 @@ def process_staff_roster(results, contents):
                     },
             
             'column_fills': {
-                    'DaysRemain': lambda cell: filter_days_remain(cell, TODAY, fill_remain),
+                    'DaysRemain': lambda cell: filter_days_remain(cell),
                     'On Job': lambda cell: filter_on_job(cell),
-                    'Region': lambda cell: filter_region(cell, results),
+                    },
+            'column_row_fills': {
+                    'DaysRemain': lambda values: days_remain_fills(values, fill_remain),
                     },
             'pre_fixup': pre_fixup,
-            'post_fixup': post_fixup_staff,
-            'row_filter': row_filter,
+            'post_fixup': post_fixup,
             }
 
+    if config.CONDITIONAL_FILLS:
+        # the same test as days_remain_fills, done by Excel
+        del params['column_row_fills']['DaysRemain']
+        params['conditional_fills'] = { 'DaysRemain': [ ('AND(ISNUMBER({cell}), {cell}<=4)', fill_remain) ] }
+
+    # one pass sorts every row into active or outprocessed, and by GAP group within those;
+    # each sheet below then only visits its own rows
+    in_ws = workbook_registry.get_table(report_file)
+    partition = partition_staff_rows(in_ws, params['in_starting_row'])
+
+    active_rows, active_groups = partition['active']
+    released_rows, released_groups = partition['released']
+
+    NCCR = '05R28'
+    region = in_ws.columns[in_ws.column_index(params['in_starting_row'])['Region']]
+
+    results['staff_total'] = len(active_rows)
+    results['staff_nccr'] = sum(1 for row in active_rows if region[row] == NCCR)
+    results['staff_outprocessed'] = len(released_rows)
+
+    params['rows'] = active_rows
     results['files'].append(params['out_file_name'])
-    process_common(contents, params, groups=gap_groups)
+    process_common_table(in_ws, params, groups=active_groups, write_only=config.WRITE_ONLY_OUTPUT)
 
-    gap_groups = {}
     params['sheet_name'] = 'Outprocessed'
     params['out_file_name'] = f'{ config.DR_NAME } Outprocessed Roster { TIMESTAMP }.xlsx'
     params['table_name'] = 'Outprocessed'
-    params['row_filter'] = lambda row, out_column_map: not row_filter(row, out_column_map)
-    params['column_fills']['Region'] = lambda cell: filter_outprocessed(cell, results)
-    params['post_fixup'] = post_fixup_outprocessed
+    params['rows'] = released_rows
 
     results['files'].append(params['out_file_name'])
-    process_common(contents, params, groups=gap_groups)
+    process_common_table(in_ws, params, groups=released_groups, write_only=config.WRITE_ONLY_OUTPUT)
 
 
+def partition_staff_rows(in_ws, title_row):
+    """ sort the staff roster body rows into active and released, and each of those by GAP group
 
-def process_shift_tool(results, contents):
-    """ prepare the dro shift tool spreadsheet """
+        returns { 'active': (rows, groups), 'released': (rows, groups) }, where rows lists the
+        (origin zero) input rows in the bucket and groups maps a GAP group ('DST', 'MC', ...) to
+        its rows.  Every group seen in either bucket is in both, so the two workbooks get the
+        same sheets; rows whose GAP has no group are in every group.
+    """
+
+    column_index = in_ws.column_index(title_row)
+    released_col = in_ws.columns[column_index['Released']]
+    gap_col = in_ws.columns[column_index['GAP(s)']]
+
+    # rows, rows by group, rows with no group
+    buckets = {
+            'active': ([], {}, []),
+            'released': ([], {}, []),
+            }
+    group_names = set()
+
+    for row in range(title_row + 1, in_ws.nrows):
+        rows, group_rows, ungrouped = buckets['active' if released_col[row] == '' else 'released']
+        rows.append(row)
+
+        match = gap_group_re.match(gap_col[row])
+        if match is None:
+            ungrouped.append(row)
+        else:
+            group = match.group(1)
+            group_names.add(group)
+            if group not in group_rows:
+                group_rows[group] = []
+            group_rows[group].append(row)
 
-    fill_today = openpyxl.styles.PatternFill(fgColor='C9E2B8', fill_type='solid')
-    fill_tomorrow = openpyxl.styles.PatternFill(fgColor='9BC2E6', fill_type='solid')
+    log.debug(f"staff roster groups { sorted(group_names) }")
 
-    def filter_days(cell, today, fill_today, fill_tomorrow):
-        """ decide if there is a special fill to apply to the cell """
-        if cell.value == '':
-            return
-        excel_date = cell.value
-        dt = datetime.datetime.fromordinal(ORDINAL_1900_01_01 + int(excel_date) -2)
-        date = dt.date()
+    partition = {}
+    for name, (rows, group_rows, ungrouped) in buckets.items():
+        groups = {}
+        for group in group_names:
+            groups[group] = list(heapq.merge(group_rows.get(group, []), ungrouped))
+        partition[name] = (rows, groups)
 
-        if date == today:
-            cell.fill = fill_today
-        elif date == datetime.timedelta(1) + today:
-            cell.fill = fill_tomorrow
+    return partition
+
+
+
+def process_shift_tool(results, config, report_file):
+    """ prepare the dro shift tool spreadsheet """
+
+    fill_today = report_styles.FILL_TODAY
+    fill_tomorrow = report_styles.FILL_TOMORROW
+
+    # fills by excel_dates.BUCKET_LIMITS bucket of the shift date
+    bucket_fills = { 'today': fill_today, 'tomorrow': fill_tomorrow }
 
 
     def pre_fixup(in_ws, out_ws):
@@ -609,14 +721,14 @@ def process_shift_tool(results, contents):
         out_ws['H1'].fill = fill_today
         out_ws['H2'].fill = fill_tomorrow
 
-        title_font = openpyxl.styles.Font(name='Arial', size=14, bold=True)
+        title_font = report_styles.TITLE_FONT
         out_ws['A1'].font = out_ws['A2'].font = title_font
         out_ws['F1'].font = out_ws['F2'].font = title_font
 
 
     params = {
             'sheet_name': 'DRO Shift Tool',
-            'out_file_name': f'DRO Shift Tool { TIMESTAMP }.xlsx',
+            'out_file_name': f'{ config.DR_NAME } DRO Shift Tool { TIMESTAMP }.xlsx',
             'table_name': 'ShiftTool',
             'in_starting_row': 2,
             'out_starting_row': 3,
@@ -646,65 +758,68 @@ def process_shift_tool(results, contents):
                 'Type of ID Presented',
                 ],
             
-            'column_fills': {
-                    'Start Date': lambda cell: filter_days(cell, TODAY, fill_today, fill_tomorrow),
+            'column_row_fills': {
+                    'Start Date': lambda values: date_fills(values, TODAY, bucket_fills),
                     },
             'pre_fixup': pre_fixup,
             #'post_fixup': post_fixup,
             #'row_filter': row_filter,
             }
 
+    if config.CONDITIONAL_FILLS:
+        # let Excel colour the dates against the day the file is opened
+        del params['column_row_fills']['Start Date']
+        params['conditional_fills'] = { 'Start Date': report_styles.bucket_rules(bucket_fills) }
+
     results['files'].append(params['out_file_name'])
-    process_common(contents, params)
+    process_common(report_file, params, write_only=config.WRITE_ONLY_OUTPUT)
 
 
 
 
-def process_common(contents, params, groups=None):
-    """ common code to process all sheets """
-    
+def date_fills(values, today, bucket_fills):
+    """ the fill for each row of a date column, by its bucket from today, worked out
+        for the whole column at once (for the column_row_fills param)
+    """
+    return excel_dates.bucket_fills(excel_dates.day_offsets(values, today), bucket_fills)
 
-    in_wb = xlrd.open_workbook(file_contents=contents)
-    in_ws = in_wb.sheet_by_index(0)
 
-    out_wb = openpyxl.Workbook()
-    out_ws = out_wb.create_sheet(title=params['sheet_name'])
+def process_common(report_file, params, groups=None, write_only=False):
+    """ common code to process all sheets """
 
+    # parse the report once; every sheet below reads from the same table
+    in_ws = workbook_registry.get_table(report_file)
 
-    process_common_sheet(in_ws, out_ws, contents, params)
+    process_common_table(in_ws, params, groups, write_only)
 
 
-    if groups is not None and len(groups) > 0:
-        # add extra sheets
-        group_names = sorted(list(groups.keys()))
-        log.debug(f"group_names { group_names } groups { groups }")
+def process_common_table(in_ws, params, groups=None, write_only=False):
+    """ write the output workbook for an already parsed report
 
-        for name in group_names:
-            orig_filter = None
-            if 'row_filter' in params:
-                orig_filter = params['row_filter']
+        groups - optional dict mapping extra sheet names to the input rows that go on each
+        write_only - stream the rows straight to the file (see report_workbook)
+    """
 
+    out_wb = report_workbook.ReportWorkbook(write_only=write_only)
+    out_ws = out_wb.create_sheet(title=params['sheet_name'])
 
-                def group_row_filter(row, out_column_map):
-                    """ pre-filter to ignore GAPs in the wrong group """
-                    gap = row[out_column_map['GAP(s)']]
-                    match = gap_group_re.match(gap)
 
-                    if match is not None:
-                        group = match.group(1)
-                        if group != name:
-                            return False
+    process_common_sheet(in_ws, out_ws, params)
 
-                    return orig_filter(row, out_column_map)
 
-                params['row_filter'] = group_row_filter
+    if groups is not None and len(groups) > 0:
+        # add extra sheets
+        group_names = sorted(list(groups.keys()))
+        log.debug(f"group_names { group_names }")
 
+        all_rows = params.get('rows')
+        for name in group_names:
             out_ws = out_wb.create_sheet(title=name)
             params['table_name'] = name
-            process_common_sheet(in_ws, out_ws, contents, params)
+            params['rows'] = groups[name]
+            process_common_sheet(in_ws, out_ws, params)
 
-            if orig_filter is not None:
-                params['row_filter'] = orig_filter
+        params['rows'] = all_rows
 
 
     default_sheet_name = 'Sheet'
@@ -717,7 +832,7 @@ def process_common(contents, params, groups=None):
 
 
 
-def process_common_sheet(in_ws, out_ws, contents, params):
+def process_common_sheet(in_ws, out_ws, params):
 
     # do some ws dependent preliminary initialization
     if 'pre_fixup' in params:
@@ -739,59 +854,40 @@ def process_common_sheet(in_ws, out_ws, contents, params):
     #log.debug(f"in_column_map { in_column_map }")
     #log.debug(f"out_column_map { out_column_map }")
 
-    col_format = {}
-    for col_name, cell_format in params['column_formats'].items():
-        col_format[col_name] = cell_format
-
     for col_name, col_width in params['column_widths'].items():
         col_index = out_column_map[col_name]
         col_letter = openpyxl.utils.cell.get_column_letter(col_index)
         out_ws.column_dimensions[col_letter].width = col_width
 
-    col_alignment = {}
-    for col_name, alignment in params['column_alignments'].items():
-        col_alignment[col_name] = alignment
-
-    col_fills = {}
-    for col_name, fill in params['column_fills'].items():
-        col_fills[col_name] = fill
+    # work out what each column needs once, rather than looking it up for every cell; each
+    # column's formatting becomes a named style in the output workbook
+    styles = report_styles.registry(out_ws.parent)
+    plan = sheet_plan.compile_plan(in_ws.columns, in_column_map, out_column_map, params, styles=styles)
 
     # now deal with the body of the message
     num_rows = in_ws.nrows - in_starting_row
-    row_filter = lambda x, y: True
-    if 'row_filter' in params:
-        row_filter = params['row_filter']
-
-    #log.debug(f"num_rows { num_rows }")
-    out_index = out_starting_row -1
-    for index in range(num_rows):
-        in_row = in_ws.row_values(index + in_starting_row)
+    if 'rows' in params:
+        # the caller has already picked the body rows for this sheet
+        in_rows = params['rows']
+    else:
+        row_filter = lambda x, y: True
+        if 'row_filter' in params:
+            row_filter = params['row_filter']
 
         # allow us to ignore rows
-        if index > 0 and not row_filter(in_row, in_column_map):
-            continue
-
-        out_index += 1
-
-        for col_name, out_col in out_column_map.items():
-            in_col = in_column_map[col_name]
-            cell = out_ws.cell(row=out_index, column=out_col, value=in_row[in_col])
-
-            if index > 0:
-                if col_name in col_format:
-                    # handle special column formats
-                    cell.number_format = col_format[col_name]
-
-                if col_name in col_fills:
-                    col_fills[col_name](cell)
+        in_rows = ( index for index in range(in_starting_row +1, in_ws.nrows)
+                if row_filter(in_ws.row(index), in_column_map) )
 
-            if col_name in col_alignment:
-                cell.alignment = col_alignment[col_name]
+    #log.debug(f"num_rows { num_rows }")
+    sheet_plan.write_title_row(out_ws, out_starting_row, plan)
 
-    # do some ws dependent table fixup after the copy
+    # do some ws dependent fixup of the titles.  The fixups only touch the header rows (and
+    # freeze panes), so they run before the body; a streamed sheet can't go back to them later
     if 'post_fixup' in params:
         params['post_fixup'](out_ws)
 
+    report_workbook.start_body(out_ws)
+    last_row = sheet_plan.write_rows(out_ws, out_starting_row +1, plan, in_rows, styles)
 
     # now make a table of the data
     start_col = 'A'
@@ -801,11 +897,16 @@ def process_common_sheet(in_ws, out_ws, contents, params):
     table = openpyxl.worksheet.table.Table(displayName=params['table_name'], ref=table_ref)
     out_ws.add_table(table)
 
+    # highlights Excel works out for itself, over each column's body cells
+    for col_name, rules in params.get('conditional_fills', {}).items():
+        col_letter = openpyxl.utils.cell.get_column_letter(out_column_map[col_name])
+        report_styles.add_conditional_fills(out_ws, col_letter, out_starting_row +1, last_row, rules)
+
 
 
 
 def process_title_row(row, delete_columns):
-    """ process an xlrd title row, returning a map of column names to column indexes (origin zero) """
+    """ process a title row, returning a map of column names to column indexes (origin zero) """
     in_column_map = {}
     out_column_map = {}
     out_col = 0
@@ -822,7 +923,7 @@ def process_title_row(row, delete_columns):
 
 
 
-def read_air_travel_roster(session, config, args):
+def read_air_travel_roster(client, config, args):
 
     params0 = {
             'query_id': '481261',
@@ -842,11 +943,11 @@ def read_air_travel_roster(session, config, args):
             }
 
 
-    return read_common(session, config, args, params0, params1, "cached_air_travel_roster.xls")
+    return read_common(client, config, args, params0, params1)
 
 
 
-def read_arrival_roster(session, config, args):
+def read_arrival_roster(client, config, args):
 
     params0 = {
             'query_id': '1537756',
@@ -873,11 +974,11 @@ def read_arrival_roster(session, config, args):
             }
 
 
-    return read_common(session, config, args, params0, params1, "cached_arrival_roster.xls")
+    return read_common(client, config, args, params0, params1)
 
 
 
-def read_open_requests(session, config, args):
+def read_open_requests(client, config, args):
     """ read open staff requests """
 
     params0 = {
@@ -897,10 +998,10 @@ def read_open_requests(session, config, args):
             'prompt0': params0['prompt1'],
             }
 
-    return read_common(session, config, args, params0, params1, "cached_open_staff_requests.xls")
+    return read_common(client, config, args, params0, params1)
 
 
-def read_shift_tool(session, config, args):
+def read_shift_tool(client, config, args):
     """ read the dro shift tool query """
 
     yesterday = TODAY - datetime.timedelta(1)
@@ -930,10 +1031,10 @@ def read_shift_tool(session, config, args):
             'prompt3': "['Registered']",
             }
 
-    return read_common(session, config, args, params0, params1, "shift_tools.xls")
+    return read_common(client, config, args, params0, params1)
 
 
-def read_staff_roster(session, config, args):
+def read_staff_roster(client, config, args):
     """ read the staff roster """
 
     dr_id = config.VC_DR_ID
@@ -970,75 +1071,47 @@ def read_staff_roster(session, config, args):
             'prompt8': params0['prompt9'],
             }
 
-    return read_common(session, config, args, params0, params1, "cached_staff_roster.xls")
+    return read_common(client, config, args, params0, params1)
 
 
 
 
-def read_common(session, config, args, params0, params1, filename):
+def read_common(client, config, args, params0, params1, max_age=None):
+    """ return the path of a report's file, going through the shared report cache
 
-    url = "https://volunteerconnection.redcross.org"
+        with --cached-input whatever copy is in the cache is used, however old it is
+    """
 
-    if 'cached_input' in args and args.cached_input:
-        log.debug(f"Using cached input data from { filename }")
-        with open(filename, "rb") as fd:
-            content = fd.read()
-            return content
+    offline = 'cached_input' in args and args.cached_input
+    download = lambda fh: client.download_report(params0, params1, fh)
 
+    return report_cache.get_report(config, params0, download, max_age=max_age, offline=offline)
 
-    headers = {
-            #'accept': 'application/json, text/javascript, */*; q=0.01',
-            'accept': '*/*',
-            'accept-language': 'en-US,en;q=0.9',
-            'content-type': 'application/x-www-form-urlencoded; charset=UTF-8',
-            'DNT': '1',
-            'Host': 'volunteerconnection.redcross.org',
-            'Origin': 'https://volunteerconnection.redcross.org',
-            'Referer': 'https://volunteerconnection.redcross.org/',
-            'Sec-Fetch-Dest': 'empty',
-            'Sec-Fetch-Mode': 'cors',
-            'Sec-Fetch-Site': 'same-origin',
-            'sec-gpc': '1',
-            'User-Agent': '.Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/86.0.4240.75 Safari/537.36',
-            'X-Requested-With': 'XMLHttpRequest',
-            }
-
-    #log.debug(f"params0 { params0 } params1 { params1 }")
-    response = session.post(url, data=params0, headers=headers, timeout=config.WEB_TIMEOUT)
-    response.raise_for_status()
 
+class AttrDict(dict):
+    def __init__(self, *args, **kwargs):
+        super(AttrDict, self).__init__(*args, **kwargs)
+        self.__dict__ = self
 
-    response = session.post(url, data=params1, headers=headers, timeout=config.WEB_TIMEOUT)
-    response.raise_for_status()
+    def __reduce__(self):
+        # pickle (to send to the report workers) as the items, so a copy's attributes are its items too
+        return (AttrDict, (dict(self),))
 
-    #log.debug(f"response.content { response.content }")
-    anchor = response.html.find('a', first=True)
-    href = anchor.attrs['href']
 
-    url2 = url + href
+def dr_configs(config):
+    """ the config to use for each DR we report on
 
-    log.debug(f"url2 { url2 }")
+        config.DRS lists per-DR overrides (VC_DR_ID, DR_NAME, MAIL_ADDRESS, ...) of the top level
+        settings; if it is empty we just do the one DR the top level settings describe.
+    """
 
-    response = session.get(url2, timeout=config.WEB_TIMEOUT)
-    response.raise_for_status()
+    if len(config.DRS) == 0:
+        return [ config ]
 
-    log.debug(f"retrieved document.  size is { len(response.text) }, type is '{ response.headers.get('content-type') }'")
-    #log.debug(f"document: { response.content }")
+    return [ AttrDict(config, **dr) for dr in config.DRS ]
 
-    if 'save_input' in args and args.save_input:
-        log.debug(f"Saving input data to { filename }")
-        with open(filename, "wb") as fd:
-            fd.write(response.content)
-
-    return response.content
 
 def init_config():
-    class AttrDict(dict):
-        def __init__(self, *args, **kwargs):
-            super(AttrDict, self).__init__(*args, **kwargs)
-            self.__dict__ = self
-
-
     config_dotenv = dotenv.dotenv_values(verbose=True)
 
     config = AttrDict()
@@ -1059,8 +1132,8 @@ def parse_args():
             allow_abbrev=False)
     parser.add_argument("--debug", help="turn on debugging output", action="store_true")
     parser.add_argument("--post", help="post to real recipients", action="store_true")
-    parser.add_argument("--save-input", help="save a copy of the raw VC spreadsheets", action="store_true")
-    parser.add_argument("--cached-input", help="use the saved copies of the raw VC spreadsheets", action="store_true")
+    parser.add_argument("--save-input", help="obsolete: the raw VC spreadsheets are always kept in the report cache", action="store_true")
+    parser.add_argument("--cached-input", help="use the report cache copies of the raw VC spreadsheets, however old", action="store_true")
     parser.add_argument("--save-output", help="don't delete output spreadsheets", action="store_true")
 
     args = parser.parse_args()
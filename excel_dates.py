@@ -0,0 +1,142 @@
+#! /usr/bin/env python3
+
+# excel_dates -- convert whole columns of Excel serial dates at once
+
+import re
+import array
+import itertools
+import datetime
+import logging
+
+log = logging.getLogger(__name__)
+
+
+# Excel serial date 2 is 1900-01-01 (Excel thinks 1900 was a leap year; serial 1 is 1900-01-00)
+ORDINAL_1900_01_01 = datetime.datetime(1900, 1, 1).toordinal()
+
+# marks a cell that isn't a date in an array of day offsets
+NO_DATE = -2 ** 31
+
+# 'm/d/yy' dates, as some VC reports give them
+RE_SHORT_DATE = re.compile(r'(\d\d?)/(\d\d?)/(\d\d)')
+
+
+def to_serial(date):
+    """ the Excel serial number of a date """
+    return date.toordinal() - ORDINAL_1900_01_01 + 2
+
+
+def from_serial(serial):
+    """ the datetime (at midnight) of an Excel serial number; fractions of a day are dropped """
+    return datetime.datetime.fromordinal(ORDINAL_1900_01_01 + int(serial) - 2)
+
+
+def day_offsets(values, today):
+    """ days from today to each date in a column, as array('i')
+
+        values - the column: Excel serial numbers, with '' (or anything else that isn't a
+                number) where there is no date; a ReportTable column or numbers() array
+        today - the date to count from
+
+        Cells without a date are NO_DATE.
+    """
+
+    base = to_serial(today)
+    offsets = array.array('i', [ NO_DATE ]) * len(values)
+
+    for index, value in enumerate(values):
+        # (value == value) is False for the NaNs in a numbers() array
+        if isinstance(value, (int, float)) and value == value:
+            offsets[index] = int(value) - base
+
+    return offsets
+
+
+def bucket_counts(offsets):
+    """ count the dates in an offsets array that fall in each bucket
+
+        returns a dict with counts for 'past', 'today' and 'tomorrow'
+    """
+
+    counts = { 'past': 0, 'today': 0, 'tomorrow': 0 }
+
+    for offset in offsets:
+        if offset == NO_DATE:
+            continue
+
+        if offset < 0:
+            counts['past'] += 1
+        elif offset == 0:
+            counts['today'] += 1
+        elif offset == 1:
+            counts['tomorrow'] += 1
+
+    return counts
+
+
+def bucket_mask(offsets, low, high):
+    """ a bytearray with 1 for each date low <= offset <= high days out (None for no limit) """
+
+    low = NO_DATE + 1 if low is None else low
+    high = -NO_DATE if high is None else high
+
+    return bytearray(1 if offset != NO_DATE and low <= offset <= high else 0 for offset in offsets)
+
+
+# the day offsets in each bucket ('past', 'today', 'tomorrow'), as bucket_mask() limits
+BUCKET_LIMITS = { 'past': (None, -1), 'today': (0, 0), 'tomorrow': (1, 1) }
+
+def bucket_fills(offsets, fills):
+    """ a fill for every entry of an offsets array, from a dict of bucket name > fill
+
+        Entries in no bucket (or a bucket without a fill) get None.
+    """
+
+    result = [ None ] * len(offsets)
+    for name, fill in fills.items():
+        mask = bucket_mask(offsets, *BUCKET_LIMITS[name])
+        for index in itertools.compress(range(len(mask)), mask):
+            result[index] = fill
+
+    return result
+
+
+def format_dates(values, date_format='%Y-%m-%d'):
+    """ format a column of Excel serial dates as strings ('' where there's no date)
+
+        People on a roster share a handful of dates, so each distinct date is only formatted once.
+    """
+
+    formatted = {}
+    strings = []
+    for value in values:
+        if not isinstance(value, (int, float)) or value != value:
+            strings.append('')
+            continue
+
+        serial = int(value)
+        if serial not in formatted:
+            formatted[serial] = from_serial(serial).strftime(date_format)
+        strings.append(formatted[serial])
+
+    return strings
+
+
+_short_dates = {}
+
+def parse_short_date(text):
+    """ the datetime for an 'm/d/yy' string (or one that starts with one), else None
+
+        The same few dates come up over and over in a report, so results are remembered.
+    """
+
+    if text in _short_dates:
+        return _short_dates[text]
+
+    dt = None
+    match = RE_SHORT_DATE.match(text)
+    if match != None:
+        dt = datetime.datetime(2000 + int(match.group(3)), int(match.group(1)), int(match.group(2)))
+
+    _short_dates[text] = dt
+    return dt
@@ -0,0 +1,195 @@
+#! /usr/bin/env python3
+
+# grouped_reports -- flatten VC's "grouped by DR" report layouts into flat assignment records
+#
+# The All Assignments and Current Assignments reports don't have a DR column: each DR gets a
+# section header row (DR number and name) and the people assigned to it follow, with the title
+# row repeated now and then and a summary block at the bottom.  parse() walks such a sheet once
+# and returns one record per assignment, with the DR it belongs to filled in.
+
+import re
+import array
+import logging
+import collections
+
+import workbook_registry
+
+log = logging.getLogger(__name__)
+
+
+class GroupedReportException(Exception):
+    pass
+
+
+class Layout:
+    """ how one grouped report is laid out
+
+        title_row - origin zero row of the column titles; the first section header is just above
+        end_marker - column 0 value of the row where the summary block (which we skip) starts
+        member_col, name_col - titles of the member number and name columns
+        key_cols - three columns used to tell the row types apart: a section header has the
+                first two and not the third; a repeated title row has the third title in the third
+        assigned_col, released_col - titles of the date columns (released_col may be None)
+    """
+
+    def __init__(self, title_row, end_marker, member_col, name_col, key_cols, assigned_col, released_col):
+        self.title_row = title_row
+        self.end_marker = end_marker
+        self.member_col = member_col
+        self.name_col = name_col
+        self.key_cols = key_cols
+        self.assigned_col = assigned_col
+        self.released_col = released_col
+
+
+
+LAYOUTS = {
+        # All Assignments By DR and/or Date Range
+        'all': Layout(5, 'People Assigned by DRO', 'Mem#', 'Name', ('Mem#', 'Name', 'Chapter'), 'Assign', 'Release'),
+
+        # Disaster Responders Currently Assigned - Region
+        'current': Layout(5, 'Region:', 'Mem #', 'Name', ('Region', 'Mem #', 'Name'), 'Assigned', None),
+        }
+
+
+# one assignment: row is the input row it came from; member is None if the row has no member
+# number; dates are Excel serial numbers ('' if blank, None if the report doesn't have them)
+Assignment = collections.namedtuple('Assignment', 'row dr_number dr_name member name assigned released')
+
+RE_DR_NAME_SPLIT = re.compile(r'(\d+-\d+) (.*)')
+
+
+class GroupedReport:
+    """ a grouped report flattened to one entry per assignment, stored by field
+
+        rows - input row of each assignment, as array('i')
+        dr_numbers, dr_names, members, names, assigned, released - lists, one entry per assignment
+    """
+
+    __slots__ = ('layout', 'nrows', 'rows', 'dr_numbers', 'dr_names', 'members', 'names', 'assigned', 'released')
+
+    def __init__(self, layout, nrows):
+        self.layout = layout
+        self.nrows = nrows
+        self.rows = array.array('i')
+        self.dr_numbers = []
+        self.dr_names = []
+        self.members = []
+        self.names = []
+        self.assigned = []
+        self.released = []
+
+
+    def __len__(self):
+        return len(self.rows)
+
+
+    def records(self):
+        """ the assignments as Assignment tuples """
+        return map(Assignment, self.rows, self.dr_numbers, self.dr_names, self.members, self.names,
+                self.assigned, self.released)
+
+
+    def by_member(self):
+        """ dict of member number > list of assignment indexes (rows without a member are left out) """
+
+        index = {}
+        for i, member in enumerate(self.members):
+            if member is not None:
+                index.setdefault(member, []).append(i)
+
+        return index
+
+
+    def by_row(self, values, default=''):
+        """ spread one value per assignment out into a list indexed by input row, for writing
+            the records back out next to the rows they came from
+        """
+
+        column = [ default ] * self.nrows
+        for row, value in zip(self.rows, values):
+            column[row] = value
+
+        return column
+
+
+
+def parse_dr(number, name):
+    """ the current sheet encodes the dro name in the dro number field; split it out """
+
+    if name == '':
+        match = RE_DR_NAME_SPLIT.match(number)
+        if match != None:
+            number = match.group(1)
+            name = match.group(2)
+
+    return (number, name)
+
+
+def parse(table, layout_name):
+    """ flatten a grouped report sheet (a report_table.ReportTable) in one pass
+
+        layout_name - a key of LAYOUTS
+    """
+
+    layout = LAYOUTS[layout_name]
+    title_row = layout.title_row
+
+    titles = table.column_index(title_row)
+    for title in (layout.member_col, layout.name_col, layout.assigned_col, layout.released_col) + layout.key_cols:
+        if title is not None and title not in titles:
+            raise GroupedReportException(f"{ layout_name } report has no '{ title }' column in row { title_row +1 }")
+
+    columns = table.columns
+    col0, col1, col2 = [ columns[titles[title]] for title in layout.key_cols ]
+    member_col = columns[titles[layout.member_col]]
+    name_col = columns[titles[layout.name_col]]
+    assigned_col = columns[titles[layout.assigned_col]]
+    released_col = columns[titles[layout.released_col]] if layout.released_col is not None else None
+    first_col = columns[0]
+    col2_title = layout.key_cols[2]
+
+    report = GroupedReport(layout, table.nrows)
+
+    # the first section's header is the row above the titles
+    dr_number = table.cell_value(title_row -1, 0)
+    dr_name = table.cell_value(title_row -1, 1)
+
+    for row in range(title_row +1, table.nrows):
+        if first_col[row] == layout.end_marker:
+            # the summary block at the bottom
+            break
+
+        # repeated title rows
+        if col2[row] == col2_title:
+            continue
+
+        # blank lines
+        if col0[row] == '' and col1[row] == '':
+            continue
+
+        # a section header: the start of the next DR
+        if col2[row] == '':
+            dr_number, dr_name = parse_dr(col0[row], col1[row])
+            continue
+
+        # a row without a numeric member number gets None (so its County comes out 'unknown');
+        # the old loop carried the previous row's member number over instead
+        member = member_col[row]
+
+        report.rows.append(row)
+        report.dr_numbers.append(dr_number)
+        report.dr_names.append(dr_name)
+        report.members.append(int(member) if isinstance(member, (int, float)) else None)
+        report.names.append(name_col[row])
+        report.assigned.append(assigned_col[row])
+        report.released.append(released_col[row] if released_col is not None else None)
+
+    log.debug(f"{ layout_name } report: { len(report) } assignments")
+
+    return report
+
+
+def read_report(report_file, layout_name):
+    """ parse() a grouped report file, sharing the parsed sheet through the workbook registry """
+    return parse(workbook_registry.get_table(report_file), layout_name)
@@ -0,0 +1,330 @@
+#! /usr/bin/env python3
+
+# member_index -- persistent member number to county of residence index
+#
+# The county lookup used to be rebuilt from a full Active Positions report on every run, but
+# counties of residence hardly ever change.  The index keeps one row per member in a local
+# sqlite database, with a fingerprint of that member's report rows; an update only re-parses
+# and rewrites members whose rows changed (and drops members no longer in the report).
+#
+# Other scripts can look members up without touching VC at all:
+#
+#   python member_index.py lookup 123456 234567
+#   python member_index.py update report_cache/1394341-....xls
+#   python member_index.py stats
+
+import re
+import time
+import sqlite3
+import hashlib
+import logging
+import argparse
+import contextlib
+
+import init_logging
+log = logging.getLogger(__name__)
+
+
+class IndexException(Exception):
+    pass
+
+
+# the Active Positions report: origin zero title row, and the columns we read
+REPORT_TITLE_ROW = 5
+COL_MEMBER = 'Member #'
+COL_NAME = 'Account Name (hyperlink)'
+COL_POSITION = 'Position Name'
+COL_COUNTY = 'County of Residence'
+
+RE_Z_COUNTY = re.compile(r'Z County: (.*)')
+RE_COUNTY = re.compile(r' County$')
+
+SCHEMA = """
+create table if not exists members (
+        member_num integer primary key,
+        name text not null,
+        county text not null,           -- '' if the report doesn't give one
+        z_county text,                  -- from a 'Z County: ...' position, overrides county
+        fingerprint text not null,
+        updated real not null
+        );
+create table if not exists meta (
+        key text primary key,
+        value text
+        );
+"""
+
+
+@contextlib.contextmanager
+def open_index(index_file):
+    """ open (creating if need be) the index database; commits on a clean exit """
+
+    db = sqlite3.connect(index_file)
+    try:
+        db.executescript(SCHEMA)
+        with db:
+            yield db
+    finally:
+        db.close()
+
+
+def is_fresh(index_file, max_age):
+    """ True if the index was updated from a report in the last max_age seconds """
+
+    try:
+        with open_index(index_file) as db:
+            updated = get_meta(db, 'updated')
+    except sqlite3.Error as e:
+        log.info(f"member index { index_file } can't be read: { e }")
+        return False
+
+    return updated is not None and time.time() - float(updated) < max_age
+
+
+def load(index_file):
+    """ the whole index as a dict: member number > entry dict (see lookup)
+
+        Members without a county are left out, as the availability reports expect.
+    """
+
+    with open_index(index_file) as db:
+        rows = db.execute("select member_num, name, county, z_county from members where county != ''").fetchall()
+
+    return { row[0]: make_entry(row) for row in rows }
+
+
+def lookup(index_file, member_nums):
+    """ look up some members: returns a dict of member number > entry, for those that are known
+
+        an entry is a dict with 'member_num', 'name', 'county' and 'z-county' (or None)
+    """
+
+    member_nums = list(member_nums)
+    result = {}
+    with open_index(index_file) as db:
+        # stay well under sqlite's limit on query parameters
+        for start in range(0, len(member_nums), 500):
+            chunk = member_nums[start:start + 500]
+            marks = ','.join('?' * len(chunk))
+            for row in db.execute(f"select member_num, name, county, z_county from members where member_num in ({ marks })", chunk):
+                result[row[0]] = make_entry(row)
+
+    return result
+
+
+def make_entry(row):
+    member_num, name, county, z_county = row
+    return {
+            'member_num': member_num,
+            'name': name,
+            'county': county,
+            'z-county': z_county,
+            }
+
+
+def update(index_file, table, report_hash=None):
+    """ bring the index up to date with a parsed Active Positions report
+
+        table - the report, as a report_table.ReportTable
+        report_hash - content hash of the report file; if it's the same report the index was
+                last built from, nothing is read at all
+
+        returns a dict of counts: 'members', 'changed', 'removed'
+    """
+
+    start = time.perf_counter()
+    now = time.time()
+
+    with open_index(index_file) as db:
+        if report_hash is not None and get_meta(db, 'report_hash') == report_hash:
+            set_meta(db, 'updated', now)
+            log.debug(f"member index already built from report { report_hash[:12] }")
+            return { 'members': None, 'changed': 0, 'removed': 0 }
+
+        known = dict(db.execute("select member_num, fingerprint from members"))
+
+        columns = report_columns(table)
+        members = member_rows(columns, table.nrows)
+
+        changed = []
+        for member_num, runs in members.items():
+            fingerprint = row_fingerprint(columns, runs)
+            if known.get(member_num) == fingerprint:
+                continue
+
+            name, county, z_county = parse_member(columns, runs)
+            changed.append((member_num, name, county, z_county, fingerprint, now))
+
+        removed = [ (member_num,) for member_num in known if member_num not in members ]
+
+        db.executemany("insert or replace into members values (?, ?, ?, ?, ?, ?)", changed)
+        db.executemany("delete from members where member_num = ?", removed)
+
+        set_meta(db, 'updated', now)
+        if report_hash is not None:
+            set_meta(db, 'report_hash', report_hash)
+        else:
+            # we don't know what report this was; don't let the next update skip on a match
+            db.execute("delete from meta where key = 'report_hash'")
+
+    log.info(f"member index: { len(members) } members, { len(changed) } changed, { len(removed) } removed in { time.perf_counter() - start:.2f} s")
+    return { 'members': len(members), 'changed': len(changed), 'removed': len(removed) }
+
+
+def report_columns(table):
+    """ the report columns we read, as a dict of title > column """
+
+    titles = table.column_index(REPORT_TITLE_ROW)
+
+    columns = {}
+    for title in (COL_MEMBER, COL_NAME, COL_POSITION, COL_COUNTY):
+        if title not in titles:
+            raise IndexException(f"report has no '{ title }' column in row { REPORT_TITLE_ROW +1 }")
+        columns[title] = table.columns[titles[title]]
+
+    return columns
+
+
+def member_rows(columns, nrows):
+    """ group the report's body rows by member number: dict of member number > list of runs,
+        each run being the row indexes of one consecutive block of that member's rows
+
+        A blank member number counts as member 0, as it always has.
+    """
+
+    member_col = columns[COL_MEMBER]
+
+    members = {}
+    last_member_num = None
+    for row in range(REPORT_TITLE_ROW +1, nrows):
+        value = member_col[row]
+        member_num = int(value) if value != '' else 0
+
+        if member_num != last_member_num:
+            members.setdefault(member_num, []).append([])
+            last_member_num = member_num
+        members[member_num][-1].append(row)
+
+    return members
+
+
+def row_fingerprint(columns, runs):
+    """ hash of the cells we parse, over all of one member's rows """
+
+    columns = [ columns[title] for title in (COL_NAME, COL_POSITION, COL_COUNTY) ]
+
+    digest = hashlib.blake2b(digest_size=16)
+    for run in runs:
+        for row in run:
+            digest.update(repr(tuple(column[row] for column in columns)).encode('utf-8'))
+        digest.update(b'\0')
+
+    return digest.hexdigest()
+
+
+def parse_member(columns, runs):
+    """ name, county and z county of one member
+
+        Each run of rows is read the way the availability script always has: everything comes
+        from the first row, and a 'Z County: ...' position there overrides the county.  If the
+        member shows up in more than one run, the last one with a county wins.
+    """
+
+    name_col = columns[COL_NAME]
+    position_col = columns[COL_POSITION]
+    county_col = columns[COL_COUNTY]
+
+    result = None
+    for run in runs:
+        first = run[0]
+        name = name_col[first]
+        county = RE_COUNTY.sub('', county_col[first])
+
+        z_county = None
+        match = RE_Z_COUNTY.match(position_col[first])
+        if match != None:
+            z_county = county = match.group(1)
+
+        if result is None or county != '':
+            result = (name, county, z_county)
+
+    return result
+
+
+def get_meta(db, key):
+    row = db.execute("select value from meta where key = ?", (key,)).fetchone()
+    return row[0] if row is not None else None
+
+
+def set_meta(db, key, value):
+    db.execute("insert or replace into meta values (?, ?)", (key, str(value)))
+
+
+def stats(index_file):
+    """ a dict describing the index """
+
+    with open_index(index_file) as db:
+        members = db.execute("select count(*) from members").fetchone()[0]
+        no_county = db.execute("select count(*) from members where county = ''").fetchone()[0]
+        updated = get_meta(db, 'updated')
+        report_hash = get_meta(db, 'report_hash')
+
+    return {
+            'members': members,
+            'without_county': no_county,
+            'updated': time.strftime('%Y-%m-%d %H:%M:%S', time.localtime(float(updated))) if updated is not None else None,
+            'report_hash': report_hash,
+            }
+
+
+
+def main():
+    args = parse_args()
+    if args.debug:
+        logging.getLogger().setLevel(logging.DEBUG)
+
+    if args.command == 'lookup':
+        found = lookup(args.index, args.member)
+        for member_num in args.member:
+            entry = found.get(member_num)
+            if entry is None:
+                print(f"{ member_num }\t(not in index)")
+            else:
+                print(f"{ member_num }\t{ entry['county'] }\t{ entry['name'] }")
+
+    elif args.command == 'update':
+        import workbook_registry
+        table = workbook_registry.get_table(args.report)
+        report_hash = None if args.full else workbook_registry.content_hash(args.report)
+        print(update(args.index, table, report_hash))
+
+    elif args.command == 'stats':
+        for key, value in stats(args.index).items():
+            print(f"{ key }: { value }")
+
+
+def parse_args():
+    import config_avail
+
+    parser = argparse.ArgumentParser(
+            description="query or update the member county index",
+            allow_abbrev=False)
+    parser.add_argument("--debug", help="turn on debugging output", action="store_true")
+    parser.add_argument("--index", help="the index database", default=config_avail.MEMBER_INDEX_FILE)
+    subparsers = parser.add_subparsers(dest='command', required=True)
+
+    lookup_parser = subparsers.add_parser("lookup", help="print the county of some members")
+    lookup_parser.add_argument("member", help="member numbers", type=int, nargs='+')
+
+    update_parser = subparsers.add_parser("update", help="update the index from an Active Positions report")
+    update_parser.add_argument("--full", help="re-check every member even if the report hasn't changed", action="store_true")
+    update_parser.add_argument("report", help="the report (.xls) file")
+
+    subparsers.add_parser("stats", help="describe the index")
+
+    args = parser.parse_args()
+    return args
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,202 @@
+#! /usr/bin/env python3
+
+# report_cache -- on-disk cache of Volunteer Connection reports, shared by all the scripts
+
+import os
+import os.path
+import re
+import time
+import json
+import logging
+import hashlib
+import tempfile
+import threading
+
+log = logging.getLogger(__name__)
+
+
+class CacheException(Exception):
+    pass
+
+
+# these params0 keys select what the report contains; everything else is launch plumbing
+RE_PROMPT = re.compile(r'^prompt\d+$')
+
+# refreshes running in the background, keyed by cache key
+_refreshing = set()
+_refreshing_lock = threading.Lock()
+
+
+def cache_key(params0):
+    """ turn the report identity (query_id plus prompts) from params0 into a file-name-safe key """
+
+    identity = {
+            'query_id': params0['query_id'],
+            'output_format': params0.get('output_format', 'xls'),
+            }
+
+    for name, value in params0.items():
+        if RE_PROMPT.match(name):
+            identity[name] = value
+
+    digest = hashlib.sha256(json.dumps(identity, sort_keys=True).encode('utf-8')).hexdigest()
+
+    # lead with the query id so a human poking around the cache dir can tell what's what
+    return f"{ params0['query_id'] }-{ digest[:24] }"
+
+
+def get_report(config, params0, download, max_age=None, stale_age=None, offline=False):
+    """ return the path of a cached copy of a report, downloading it first if need be
+
+        config - needs REPORT_CACHE_DIR, REPORT_CACHE_MAX_AGE and REPORT_CACHE_STALE_AGE
+        params0 - the launch params of the report; used to compute the cache key
+        download - function taking a binary file handle; it fetches the report from VC and
+                writes it to the handle
+        max_age - seconds a cached copy stays fresh (defaults to config.REPORT_CACHE_MAX_AGE)
+        stale_age - a copy older than max_age but younger than this is returned right away while
+                a fresh one downloads in the background (defaults to config.REPORT_CACHE_STALE_AGE;
+                0 turns that off)
+        offline - never download: return the cached copy no matter how old it is
+
+        returns the path of the cached report file; the report is never held in memory here
+    """
+
+    download_many = lambda pairs: download(pairs[0][1])
+    paths = get_reports(config, [ params0 ], download_many, max_age=max_age, stale_age=stale_age, offline=offline)
+    return paths[0]
+
+
+def get_reports(config, params0_list, download_many, max_age=None, stale_age=None, offline=False):
+    """ the batch version of get_report, for reports that should be fetched together
+
+        download_many is called once with a list of (params0, fh) pairs for all the reports
+        that aren't fresh in the cache, and must write each report to its file handle.  The
+        other args are as for get_report.  Returns a list of paths, in params0_list order.
+    """
+
+    if max_age is None:
+        max_age = config.REPORT_CACHE_MAX_AGE
+    if stale_age is None:
+        stale_age = config.REPORT_CACHE_STALE_AGE
+
+    paths = []
+    missing = []
+    stale = []
+    for params0 in params0_list:
+        key = cache_key(params0)
+        path = _entry_path(config, key)
+        age = _entry_age(path)
+        paths.append(path)
+
+        if offline:
+            if age is None:
+                raise CacheException(f"report { params0['query_id'] } is not in the report cache ({ path })")
+            log.debug(f"using cached report { key } (age { int(age) }s) without checking freshness")
+        elif age is not None and age <= max_age:
+            log.debug(f"using cached report { key }: age { int(age) }s <= max age { max_age }s")
+        elif age is not None and age <= stale_age:
+            log.debug(f"using stale report { key }: age { int(age) }s; refreshing in the background")
+            stale.append(params0)
+        else:
+            log.debug(f"report { key } is { 'missing' if age is None else f'{ int(age) }s old' }; downloading")
+            missing.append(params0)
+
+    if len(stale) > 0:
+        _start_refresh(config, stale, download_many)
+
+    if len(missing) > 0:
+        put_reports(config, missing, download_many)
+
+    return paths
+
+
+def put_report(config, params0, download):
+    """ stream a freshly downloaded report into the cache; returns the path of the entry """
+
+    return put_reports(config, [ params0 ], lambda pairs: download(pairs[0][1]))[0]
+
+
+def put_reports(config, params0_list, download_many):
+    """ stream a batch of freshly downloaded reports into the cache; returns their paths """
+
+    cache_dir = config.REPORT_CACHE_DIR
+    os.makedirs(cache_dir, exist_ok=True)
+
+    # write to temp files and rename, so another process never sees half a report
+    temps = []
+    try:
+        for params0 in params0_list:
+            key = cache_key(params0)
+            fd, temp_path = tempfile.mkstemp(dir=cache_dir, prefix=f".{ key }.", suffix='.tmp')
+            temps.append((params0, key, temp_path, os.fdopen(fd, 'wb')))
+
+        download_many([ (params0, fh) for params0, key, temp_path, fh in temps ])
+
+        paths = []
+        for params0, key, temp_path, fh in temps:
+            size = fh.tell()
+            fh.close()
+            path = _entry_path(config, key)
+            os.replace(temp_path, path)
+            paths.append(path)
+            _put_meta(config, params0, key, size)
+
+    finally:
+        for params0, key, temp_path, fh in temps:
+            fh.close()
+            if os.path.exists(temp_path):
+                os.remove(temp_path)
+
+    return paths
+
+
+def _put_meta(config, params0, key, size):
+    """ leave a note next to the entry saying what it is """
+
+    meta = {
+            'query_id': params0['query_id'],
+            'params0': params0,
+            'size': size,
+            'fetched': time.strftime('%Y-%m-%d %H:%M:%S'),
+            }
+    with open(os.path.join(config.REPORT_CACHE_DIR, f"{ key }.json"), 'w') as fh:
+        json.dump(meta, fh, indent=2)
+
+    log.debug(f"cached report { key }: { size } bytes")
+
+
+def _start_refresh(config, params0_list, download_many):
+    """ download fresh copies of reports without making the caller wait for them """
+
+    with _refreshing_lock:
+        params0_list = [ p for p in params0_list if cache_key(p) not in _refreshing ]
+        keys = [ cache_key(p) for p in params0_list ]
+        _refreshing.update(keys)
+
+    if len(params0_list) == 0:
+        return
+
+    def refresh():
+        try:
+            put_reports(config, params0_list, download_many)
+        except Exception as e:
+            log.warning(f"background refresh of reports { keys } failed: { e }")
+        finally:
+            with _refreshing_lock:
+                _refreshing.difference_update(keys)
+
+    # not a daemon: let the refresh land in the cache even if the caller finishes first
+    thread = threading.Thread(target=refresh, name=f"refresh-{ keys[0] }")
+    thread.start()
+
+
+def _entry_path(config, key):
+    return os.path.join(config.REPORT_CACHE_DIR, f"{ key }.xls")
+
+
+def _entry_age(path):
+    """ seconds since the entry was stored, or None if there is no entry """
+    try:
+        return time.time() - os.path.getmtime(path)
+    except OSError:
+        return None
@@ -0,0 +1,172 @@
+#! /usr/bin/env python3
+
+# report_styles -- named cell styles, made once per workbook and applied by reference
+#
+# Setting number_format, alignment, fill and font on a cell one at a time makes openpyxl look
+# each of them up in the workbook's style lists, for every cell.  Instead, each combination the
+# reports use is added to the workbook once, as a NamedStyle, and a cell is given that style's
+# ids in one step.  styles.xml then holds one entry per combination, no matter how many cells
+# use it.
+#
+#   styles = report_styles.registry(wb)
+#   name = styles.named(number_format='yyyy-mm-dd', alignment=report_styles.LEFT_ALIGN)
+#   styles.apply(cell, name)
+#   report_styles.add(cell, fill=report_styles.FILL_TODAY)     # this cell's style, plus a fill
+#
+# The fonts, fills and alignments the reports share are defined here once too, along with the
+# conditional formatting rules that can stand in for the date highlight fills.
+
+import copy
+import logging
+import weakref
+
+import openpyxl.styles
+import openpyxl.formatting.rule
+from openpyxl.styles.cell_style import StyleArray
+from openpyxl.styles.fonts import DEFAULT_FONT
+
+log = logging.getLogger(__name__)
+
+
+LEFT_ALIGN = openpyxl.styles.Alignment(horizontal='left')
+TITLE_FONT = openpyxl.styles.Font(name='Arial', size=14, bold=True)
+RED_FONT = openpyxl.styles.Font(color='FFFF0000')
+
+FILL_TODAY = openpyxl.styles.PatternFill(fgColor='C9E2B8', fill_type='solid')
+FILL_TOMORROW = openpyxl.styles.PatternFill(fgColor='9BC2E6', fill_type='solid')
+FILL_PAST = openpyxl.styles.PatternFill(fgColor='FFDB69', fill_type='solid')
+FILL_DAYS_REMAIN = FILL_PAST
+
+# conditional formatting formulas for each excel_dates.BUCKET_LIMITS bucket; {cell} is the top
+# left cell of the range and Excel moves it along for the others.  INT() drops any time of day,
+# as excel_dates.day_offsets() does, and blank cells never match
+BUCKET_FORMULAS = {
+        'past': 'AND(ISNUMBER({cell}), INT({cell})<TODAY())',
+        'today': 'AND(ISNUMBER({cell}), INT({cell})=TODAY())',
+        'tomorrow': 'AND(ISNUMBER({cell}), INT({cell})=TODAY()+1)',
+        }
+
+
+class StyleRegistry:
+    """ the named styles added to one workbook
+
+        Styles are keyed by their (number_format, alignment, fill, font) settings; None means
+        the workbook default.
+    """
+
+    def __init__(self, wb):
+        self.wb = wb
+        self.names = {}         # settings > style name
+        self.settings = {}      # xfId of one of our styles > its settings
+        self.arrays = {}        # style name > the StyleArray a cell with that style gets
+
+
+    def named(self, number_format=None, alignment=None, fill=None, font=None):
+        """ the name of the style with these settings, adding it to the workbook the first time """
+
+        key = (number_format, alignment, fill, font)
+        name = self.names.get(key)
+        if name is not None:
+            return name
+
+        name = f"Report { len(self.names) +1 }"
+        style = openpyxl.styles.NamedStyle(name=name,
+                number_format=number_format,
+                alignment=alignment,
+                fill=fill,
+                # a NamedStyle's own default font has no name or size; keep the workbook's
+                font=font if font is not None else copy.copy(DEFAULT_FONT))
+        self.wb.add_named_style(style)
+
+        self.names[key] = name
+        self.arrays[name] = style.as_tuple()
+        self.settings[style.as_tuple().xfId] = key
+        log.debug(f"added style '{ name }': { number_format }, { alignment is not None }, { fill is not None }, { font is not None }")
+
+        return name
+
+
+    def apply(self, cell, name):
+        """ give cell the named style; any named style (like openpyxl's built in 'Hyperlink') works """
+
+        array = self.arrays.get(name)
+        if array is None:
+            # not one of ours: let openpyxl find (and if need be add) it, then remember its ids
+            cell.style = name
+            self.arrays[name] = StyleArray(cell._style)
+            return
+
+        # a cell's style is just this array of ids into the workbook's style lists
+        cell._style = StyleArray(array)
+
+
+    def add(self, cell, number_format=None, fill=None, font=None):
+        """ give cell the style it already has, with the number format, fill and/or font replaced
+
+            The cell must have the default style or one from named().
+        """
+
+        xf_id = cell._style.xfId if cell.has_style else 0
+        old_format, alignment, old_fill, old_font = self.settings.get(xf_id, (None, None, None, None))
+
+        self.apply(cell, self.named(
+                number_format if number_format is not None else old_format,
+                alignment,
+                fill if fill is not None else old_fill,
+                font if font is not None else old_font))
+
+
+
+# one registry per workbook, dropped with the workbook
+_registries = weakref.WeakKeyDictionary()
+
+def registry(wb):
+    """ the StyleRegistry of an openpyxl Workbook """
+
+    styles = _registries.get(wb)
+    if styles is None:
+        styles = _registries[wb] = StyleRegistry(wb)
+
+    return styles
+
+
+def add(cell, number_format=None, fill=None, font=None):
+    """ StyleRegistry.add for the cell's own workbook """
+    registry(cell.parent.parent).add(cell, number_format, fill, font)
+
+
+def apply(cell, name):
+    """ StyleRegistry.apply for the cell's own workbook """
+    registry(cell.parent.parent).apply(cell, name)
+
+
+def bucket_rules(bucket_fills):
+    """ conditional fill rules (see add_conditional_fills) for a dict of bucket name > fill """
+    return [ (BUCKET_FORMULAS[name], fill) for name, fill in bucket_fills.items() ]
+
+
+def add_conditional_fills(ws, col_letter, first_row, last_row, rules):
+    """ fill a column's cells from first_row to last_row by conditional formatting rules
+
+        rules - list of (formula, fill): formula is an Excel formula with {cell} standing
+                for the column's first cell; the first rule that's true picks the fill
+
+        Excel works the rules out whenever the sheet is shown, so date rules using TODAY() are
+        right on whatever day the file is opened, and the file holds one rule per fill rather
+        than a style per cell.
+    """
+
+    if last_row < first_row:
+        return
+
+    cell_range = f"{ col_letter }{ first_row }:{ col_letter }{ last_row }"
+    first_cell = f"{ col_letter }{ first_row }"
+
+    for formula, fill in rules:
+        # a conditional format's solid fill takes its colour from bgColor, not fgColor
+        colour = fill.fgColor.rgb
+        rule_fill = openpyxl.styles.PatternFill(fill_type='solid', fgColor=colour, bgColor=colour)
+
+        rule = openpyxl.formatting.rule.FormulaRule(formula=[ formula.format(cell=first_cell) ],
+                fill=rule_fill, stopIfTrue=True)
+        ws.conditional_formatting.add(cell_range, rule)
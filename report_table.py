@@ -0,0 +1,183 @@
+#! /usr/bin/env python3
+
+# report_table -- a VC report sheet parsed once and kept a column at a time
+
+import copy
+import math
+import array
+import logging
+
+import xlrd
+
+log = logging.getLogger(__name__)
+
+
+class ReportTable:
+    """ the cells of one xlrd sheet, stored by column
+
+        Reading a sheet with row_values() makes a new list for every row, every time; the
+        process stages used to do that once per output sheet.  A ReportTable copies each column
+        out of the sheet once, and after that rows are just an index into the columns:
+
+            table.columns[col][row]     - fastest, for loops that know their columns
+            table.row(row)[col]         - a Row view; no copying
+            table.cell_value(row, col)  - same as the xlrd sheet method
+            table.numbers(col)          - the column as array('d'); non-numbers are NaN
+            table.font_colours(col)     - font colour of each cell (needs formatting_info)
+            table.hyperlinks(cols)      - url of each cell's link (needs formatting_info)
+
+        sheet - the xlrd sheet the table came from (for formatting lookups), or None if the
+                table was opened without formatting_info
+    """
+
+    def __init__(self, sheet):
+        self.sheet = sheet
+        self.formatting_info = bool(sheet.book.formatting_info)
+        self.nrows = sheet.nrows
+        self.ncols = sheet.ncols
+        self.columns = [ sheet.col_values(col) for col in range(sheet.ncols) ]
+        self._numbers = {}
+
+
+    def copy(self):
+        """ a table with its own copy of the cells, for callers that change them """
+
+        table = copy.copy(self)
+        table.columns = [ list(column) for column in self.columns ]
+        table._numbers = {}
+        return table
+
+
+    def cell_value(self, row, col):
+        return self.columns[col][row]
+
+
+    def row(self, row):
+        return Row(self.columns, row)
+
+
+    def row_values(self, row):
+        """ a copy of one row as a list (for title rows and the like) """
+        return [ column[row] for column in self.columns ]
+
+
+    def column_index(self, title_row):
+        """ map each non-blank title in title_row to its (origin zero) column """
+
+        index = {}
+        for col, column in enumerate(self.columns):
+            value = column[title_row]
+            if value is not None and value != '':
+                index[value] = col
+
+        return index
+
+
+    def numbers(self, col):
+        """ the column as a typed array of floats; empty cells and text are NaN """
+
+        if col not in self._numbers:
+            values = array.array('d', [ math.nan ]) * self.nrows
+            for row, value in enumerate(self.columns[col]):
+                if isinstance(value, (int, float)):
+                    values[row] = value
+            self._numbers[col] = values
+
+        return self._numbers[col]
+
+
+    def font_colours(self, col):
+        """ the font colour index of every cell in the column, as array('H')
+
+            Only works if the table was opened with formatting_info.
+        """
+
+        sheet = self.sheet
+        book = sheet.book
+
+        # lots of cells share a few xfs; look each one up once
+        xf_colours = {}
+        colours = array.array('H', bytes(2 * self.nrows))
+        for row in range(self.nrows):
+            xf_index = sheet.cell_xf_index(row, col)
+            colour = xf_colours.get(xf_index)
+            if colour is None:
+                font = book.font_list[book.xf_list[xf_index].font_index]
+                colour = xf_colours[xf_index] = font.colour_index
+            colours[row] = colour
+
+        return colours
+
+
+    def hyperlinks(self, cols):
+        """ the url hyperlinks in some columns: dict mapping col to a list of url (or None) by row
+
+            Only works if the table was opened with formatting_info.
+        """
+
+        links = { col: [ None ] * self.nrows for col in cols }
+        for (row, col), hyperlink in self.sheet.hyperlink_map.items():
+            if col in links and hyperlink.type == 'url':
+                links[col][row] = hyperlink.url_or_path
+
+        return links
+
+
+
+class Row:
+    """ a view of one row of a ReportTable; indexing it reads (or writes) the table """
+
+    __slots__ = ('columns', 'index')
+
+    def __init__(self, columns, index):
+        self.columns = columns
+        self.index = index
+
+
+    def __getitem__(self, col):
+        return self.columns[col][self.index]
+
+
+    def __setitem__(self, col, value):
+        self.columns[col][self.index] = value
+
+
+    def __len__(self):
+        return len(self.columns)
+
+
+    def __iter__(self):
+        index = self.index
+        for column in self.columns:
+            yield column[index]
+
+
+    def values(self):
+        return [ column[self.index] for column in self.columns ]
+
+
+
+def open_table(report_file, formatting_info=False):
+    """ parse the first sheet of a report file into a ReportTable
+
+        The file is memory mapped rather than read into the heap, and only sheet 0 is ever
+        loaded (VC reports have just the one sheet that matters).  Without formatting_info the
+        columns hold all we need, so xlrd's own copy of the sheet is dropped as soon as they
+        are built, and table.sheet is None.
+    """
+
+    # xlrd mmaps the file when it is given a file name (rather than file_contents)
+    in_wb = xlrd.open_workbook(report_file, formatting_info=formatting_info, on_demand=True)
+    try:
+        table = ReportTable(in_wb.sheet_by_index(0))
+
+        if not formatting_info:
+            table.sheet = None
+            in_wb.unload_sheet(0)
+    finally:
+        # sheet 0 is loaded; we're done with the file itself
+        in_wb.release_resources()
+
+    log.debug(f"read { report_file }: { table.nrows } rows, { table.ncols } columns")
+
+    return table
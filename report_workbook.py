@@ -0,0 +1,263 @@
+#! /usr/bin/env python3
+
+# report_workbook -- output workbooks that can stream their rows straight to the xlsx file
+#
+# A normal openpyxl Workbook keeps every cell object in memory until it is saved.  In write-only
+# mode openpyxl writes each row out as it is appended instead, but then cells can't be revisited
+# and rows have to arrive in order.  The report code writes a few header cells by coordinate,
+# then a title row, then the body a row at a time -- so a StreamingSheet buffers the header
+# until the body starts, and after that only keeps the row being written.
+#
+#   wb = report_workbook.ReportWorkbook(write_only=config.WRITE_ONLY_OUTPUT)
+#   ws = wb.create_sheet(title='...')     # a Worksheet, or a StreamingSheet if write_only
+#   ... header cells, widths, freeze panes ...
+#   report_workbook.start_body(ws)        # no-op on a normal Worksheet
+#   ... body cells, in row order ...
+#   wb.save(file_name)
+#
+# Anything that comes before the rows in the xlsx (column widths, freeze panes) must be set
+# before the body starts.  Tables and conditional formatting can be added at any time.
+#
+# A WorkbookBuilder is a ReportWorkbook that knows its file name and writes it just once, after
+# all its sheets are made:
+#
+#   with report_workbook.WorkbookBuilder(file_name, write_only=...) as builder:
+#       ... make each sheet ...
+#   # saved here (or call builder.flush() to save sooner)
+
+import logging
+import warnings
+
+import openpyxl
+import openpyxl.utils.cell
+from openpyxl.cell import WriteOnlyCell
+
+log = logging.getLogger(__name__)
+
+
+class ReportWorkbookException(Exception):
+    pass
+
+
+class ReportWorkbook:
+    """ an openpyxl Workbook (write-only or not) with the few Workbook methods the reports use """
+
+    def __init__(self, write_only=False):
+        self.write_only = write_only
+        self.wb = openpyxl.Workbook(write_only=write_only)
+        self.sheets = {}
+
+
+    def create_sheet(self, title):
+        ws = self.wb.create_sheet(title=title)
+        if self.write_only:
+            ws = StreamingSheet(ws)
+        self.sheets[title] = ws
+        return ws
+
+
+    def __contains__(self, title):
+        return title in self.wb.sheetnames
+
+
+    def __getitem__(self, title):
+        return self.sheets[title] if title in self.sheets else self.wb[title]
+
+
+    def __delitem__(self, title):
+        del self.wb[title]
+        self.sheets.pop(title, None)
+
+
+    @property
+    def sheetnames(self):
+        return self.wb.sheetnames
+
+
+    def save(self, file_name):
+        for ws in self.sheets.values():
+            if isinstance(ws, StreamingSheet):
+                ws.close()
+
+        self.wb.save(file_name)
+
+
+
+class WorkbookBuilder(ReportWorkbook):
+    """ a ReportWorkbook that collects its sheets and saves them to file_name once
+
+        Used as a context manager, it saves when the with block finishes cleanly.
+    """
+
+    # openpyxl's default first sheet, which a normal workbook starts with
+    DEFAULT_SHEET_NAME = 'Sheet'
+
+    def __init__(self, file_name, write_only=False):
+        super().__init__(write_only=write_only)
+        self.file_name = file_name
+        self.saved = False
+
+
+    def __enter__(self):
+        return self
+
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        if exc_type is None:
+            self.flush()
+        return False
+
+
+    def flush(self):
+        """ write the file, if that hasn't been done already """
+
+        if self.saved:
+            return
+
+        if self.DEFAULT_SHEET_NAME in self and self.DEFAULT_SHEET_NAME not in self.sheets:
+            del self[self.DEFAULT_SHEET_NAME]
+
+        self.save(self.file_name)
+        self.saved = True
+
+
+
+class StreamingSheet:
+    """ a write-only worksheet that still allows the header to be written in any order
+
+        Until start_body() is called, cells are just collected.  After that, writing a cell in
+        some row writes out every earlier row: those rows are gone, and writing to them again is
+        an error.
+    """
+
+    def __init__(self, ws):
+        self.ws = ws
+        self.pending = {}       # row > { column > WriteOnlyCell } not written out yet
+        self.next_row = 1       # the first row not written out yet
+        self.streaming = False
+        self.header_values = {} # (row, column) > value of the cells written before the body
+
+
+    @property
+    def title(self):
+        return self.ws.title
+
+
+    @property
+    def parent(self):
+        return self.ws.parent
+
+
+    @property
+    def column_dimensions(self):
+        return self.ws.column_dimensions
+
+
+    @property
+    def conditional_formatting(self):
+        # written after the rows, so rules can be added at any time
+        return self.ws.conditional_formatting
+
+
+    @property
+    def freeze_panes(self):
+        return self.ws.freeze_panes
+
+
+    @freeze_panes.setter
+    def freeze_panes(self, top_left):
+        if self.next_row > 1:
+            raise ReportWorkbookException(f"sheet { self.title }: freeze panes must be set before the rows are written")
+
+        if not isinstance(top_left, str) and top_left is not None:
+            top_left = top_left.coordinate
+        self.ws.freeze_panes = top_left
+
+
+    def cell(self, row, column, value=None):
+        """ like Worksheet.cell: the cell at (row, column), with its value set if value isn't None """
+
+        if row < self.next_row:
+            raise ReportWorkbookException(f"sheet { self.title }: row { row } has already been written")
+
+        if self.streaming:
+            self.flush(row)
+
+        cells = self.pending.setdefault(row, {})
+        cell = cells.get(column)
+        if cell is None:
+            cell = cells[column] = WriteOnlyCell(self.ws)
+            cell.row = row
+            cell.column = column
+
+        if value is not None:
+            cell.value = value
+
+        return cell
+
+
+    def __getitem__(self, coordinate):
+        row, column = openpyxl.utils.cell.coordinate_to_tuple(coordinate.upper())
+        return self.cell(row, column)
+
+
+    def __setitem__(self, coordinate, value):
+        self[coordinate].value = value
+
+
+    def start_body(self):
+        """ the header is done: from here on, rows are written out as soon as a later one starts """
+
+        for row, cells in self.pending.items():
+            for column, cell in cells.items():
+                self.header_values[(row, column)] = cell.value
+
+        self.streaming = True
+
+
+    def flush(self, before_row):
+        """ write out all the rows before before_row """
+
+        for row in range(self.next_row, before_row):
+            cells = self.pending.pop(row, None)
+            if cells is None:
+                self.ws.append([])
+                continue
+
+            values = [ None ] * max(cells)
+            for column, cell in cells.items():
+                values[column -1] = cell
+            self.ws.append(values)
+
+        self.next_row = max(self.next_row, before_row)
+
+
+    def add_table(self, table):
+        """ add a table; write-only sheets can't look up the column names, so fill them in here """
+
+        if not table.tableColumns:
+            min_col, min_row, max_col, max_row = openpyxl.utils.cell.range_boundaries(table.ref)
+            table._initialise_columns()
+            if table.headerRowCount:
+                for column, table_column in zip(range(min_col, max_col +1), table.tableColumns):
+                    table_column.name = str(self.header_values.get((min_row, column)))
+
+        # openpyxl warns about every table on a write-only sheet; we've just done what it asks
+        with warnings.catch_warnings():
+            warnings.filterwarnings('ignore', message='In write-only mode')
+            self.ws.add_table(table)
+
+
+    def close(self):
+        """ write out whatever is left """
+
+        if len(self.pending) > 0:
+            self.flush(max(self.pending) +1)
+
+
+
+def start_body(ws):
+    """ tell a StreamingSheet its header is done; does nothing to a normal Worksheet """
+
+    if isinstance(ws, StreamingSheet):
+        ws.start_body()
@@ -15,13 +15,18 @@ import openpyxl.styles
 import openpyxl.worksheet.table as table
 import openpyxl.styles.colors
 import dotenv
-import xlrd
-import O365
 
-import vc_session
+# O365, jinja2 and the VC client are imported in main() only on the paths that use them
+
+import vc_fetch
+import report_cache
+import report_table
+import excel_dates
+import workbook_registry
+import report_workbook
+import report_styles
 import daily_staffing_reports
 import config as config_static
-import gen_templates
 
 
 log = logging.getLogger(__name__)
@@ -40,10 +45,10 @@ def main():
         logging.getLogger().setLevel(logging.DEBUG)
     log.debug("running...")
 
-    global config
     config = init_config()
 
     # initialize office 365 graph api
+    import O365
     credentials = (config.CLIENT_ID, config.CLIENT_SECRET)
 
     scopes = [
@@ -74,24 +79,42 @@ def main():
 
     # initialize volunteer connection api
 
-    roster_file = config.ROSTER_FILE
-    if args.cached_input:
-        if not os.path.exists(roster_file):
-            log.fatal(f"Roster file { roster_file } not found")
-            sys.exit(1)
-        with open(roster_file, "rb") as file:
-            data = file.read()
-    else:
-        session = vc_session.get_session(config)
-        data = daily_staffing_reports.read_staff_roster(session, config, args)
-        if args.save_input:
-            with open(roster_file, "wb") as file:
-                file.write(data)
+    # the staff roster comes out of the shared report cache, so a copy pulled recently by
+    # daily_staffing_reports is reused rather than fetched again
+    client = None
+    if not args.cached_input:
+        import vc_client
+        import vc_session
+        client = vc_client.VCClient(vc_session.get_session(config), config, pool_size=config.FETCH_WORKERS)
+
+    templates = None
+    if args.send or args.test_send:
+        import gen_templates
+        templates = gen_templates.init()
+
+    # one roster per DR, all fetched at once; each is handled as soon as it arrives
+    drs = daily_staffing_reports.dr_configs(config)
+
+    fetch_jobs = {}
+    for dr_index, dr_config in enumerate(drs):
+        fetch_jobs[dr_index] = lambda dr_config=dr_config: daily_staffing_reports.read_staff_roster(client, dr_config, args)
 
+    try:
+        for dr_index, roster_file in vc_fetch.fetch_reports(fetch_jobs, max_workers=config.FETCH_WORKERS):
+            generate_roster(account, templates, drs[dr_index], args, roster_file)
+    except report_cache.CacheException as e:
+        log.fatal(f"{ e }")
+        sys.exit(1)
 
-    roster_wb = xlrd.open_workbook(file_contents=data)
 
-    output_wb = make_workbook(roster_wb, config)
+def generate_roster(account, templates, config, args, roster_file):
+    """ build one DR's roster workbook and send its mail """
+
+    log.debug(f"generating roster for { config.DR_NAME }")
+
+    roster_table = workbook_registry.get_table(roster_file)
+
+    output_wb, sheet_data = make_workbook(roster_table, config)
 
     if args.save_output:
         output_file = config.OUTPUT_FILE
@@ -101,50 +124,47 @@ def main():
         output_wb.save(output_file)
 
 
-    templates = gen_templates.init()
-    date = datetime.datetime.now().strftime("%Y-%m-%d %H%M")
+    if templates is not None:
+        date = datetime.datetime.now().strftime("%Y-%m-%d %H%M")
 
-    if args.send or args.test_send:
         if args.sups:
-            send_mail(account, date, output_wb[config.OUTPUT_SHEET_REPORTING], templates.get_template("mail_supervisor.html"), f"{ config.DR_NAME } Supervisor", config, args)
+            send_mail(account, date, sheet_data[config.OUTPUT_SHEET_REPORTING], templates.get_template("mail_supervisor.html"), f"{ config.DR_NAME } Supervisor", config, args)
 
         if args.responders:
-            send_mail(account, date, output_wb[config.OUTPUT_SHEET_NONSVS],    templates.get_template("mail_nonsvs.html"), config.DR_NAME, config, args)
+            send_mail(account, date, sheet_data[config.OUTPUT_SHEET_NONSVS],    templates.get_template("mail_nonsvs.html"), config.DR_NAME, config, args)
 
         if args.short:
-            send_mail(account, date, output_wb[config.OUTPUT_SHEET_3DAYS],    templates.get_template("mail_3days.html"), config.DR_NAME, config, args)
+            send_mail(account, date, sheet_data[config.OUTPUT_SHEET_3DAYS],    templates.get_template("mail_3days.html"), config.DR_NAME, config, args)
+
 
+def send_mail(account, date, sheet, template, label, config, args):
+    """ send a message to everyone on one of the people sheets
 
-def send_mail(account, date, ws, template, label, config, args):
+        sheet - (titles, rows) for the sheet, as returned by generate_sheet
+    """
 
-    title_row = ws[1]
+    titles, rows = sheet
     title_dict = {}
 
-    col_index = 0
-    for col in title_row:
-        value = title_row[col_index].value.replace(' ', '_')
+    for col_index, title in enumerate(titles):
+        value = title.replace(' ', '_')
 
         #log.debug(f"title_row: { col_index } = '{ value }'")
 
         title_dict[col_index] = value
-        col_index += 1
 
-    for row_index in range(1, ws.max_row):
-        row = ws[row_index + 1]
+    for row_index, row in enumerate(rows, 1):
 
-        col_index = 0
         context = {
                 'Date': date,
                 'mail_owner': config.MAIL_OWNER,
                 'dr_name': config.DR_NAME,
                 }
-        for col in row:
-            value = row[col_index].value
+        for col_index, value in enumerate(row):
             col_name = title_dict[col_index]
             #log.debug(f"row { row_index }: { col_name } = '{ value }'")
 
             context[col_name] = value;
-            col_index += 1
 
         expand = template.render(context)
         log.debug(f"message: { expand }")
@@ -169,11 +189,20 @@ def send_mail(account, date, ws, template, label, config, args):
 def make_workbook(roster_wb, config):
     """ common point to generate output workbook from input workbook.
 
+        roster_wb is an xlrd book, or a report_table.ReportTable already parsed from one.
+
+        returns the workbook (a report_workbook.ReportWorkbook) and a dict mapping the names of
+        the people sheets to what went on them, as (titles, rows of values) -- the mail is made
+        from that, since a write-only workbook can't be read back.
+
         All file operations are 'above' this function (i.e. done by the callers
         of this function)
     """
 
-    roster_ws = roster_wb.sheet_by_index(0)
+    if isinstance(roster_wb, report_table.ReportTable):
+        roster_ws = roster_wb
+    else:
+        roster_ws = report_table.ReportTable(roster_wb.sheet_by_index(0))
 
     current_row = config.ROSTER_TITLE_ROW
 
@@ -181,26 +210,27 @@ def make_workbook(roster_wb, config):
 
     sup_dict, no_sups, name_dict = process_roster(roster_ws, current_row, title_names, title_cols)
 
-    output_wb = openpyxl.Workbook()
+    output_wb = report_workbook.ReportWorkbook(write_only=config.WRITE_ONLY_OUTPUT)
+    sheet_data = {}
 
 
     # add the reporting info
-    generate_sups(output_wb, sup_dict, name_dict, config.OUTPUT_SHEET_REPORTING)
+    sheet_data[config.OUTPUT_SHEET_REPORTING] = generate_sups(output_wb, sup_dict, name_dict, config.OUTPUT_SHEET_REPORTING)
 
     # add the no_sups folks
     ws = output_wb.create_sheet(title=config.OUTPUT_SHEET_NOSUPS)
     generate_no_sups(ws, no_sups, title_cols)
 
     # add the non_supervisor folks
-    generate_non_svs(output_wb, sup_dict, name_dict, config.OUTPUT_SHEET_NONSVS)
+    sheet_data[config.OUTPUT_SHEET_NONSVS] = generate_non_svs(output_wb, sup_dict, name_dict, config.OUTPUT_SHEET_NONSVS)
 
-    generate_3days(output_wb, sup_dict, name_dict, config.OUTPUT_SHEET_3DAYS)
+    sheet_data[config.OUTPUT_SHEET_3DAYS] = generate_3days(output_wb, sup_dict, name_dict, config.OUTPUT_SHEET_3DAYS, config.DAYS_BEFORE_WARNING)
 
     default_sheet_name = 'Sheet'
     if default_sheet_name in output_wb:
         del output_wb[default_sheet_name]
 
-    return output_wb
+    return output_wb, sheet_data
 
 
 
@@ -225,38 +255,102 @@ def parse_title_row(ws, title_row):
     return title_name_dict, title_col_dict
 
 
+class Responder:
+    """ one person on the staff roster
+
+        Everything the output sheets show about a person is worked out here once, when the
+        roster is read, instead of by every sheet that lists them.
+    """
+
+    __slots__ = (
+            'name', 'first', 'last', 'email', 'cell_phone', 'district',
+            'sup',                  # 'Current/Last Supervisor' as given; the sup_dict key
+            'supervisor',           # ... or 'NO SUPERVISOR'
+            'gap',                  # last GAP, or 'No Assignment'
+            'location_type', 'work_location', 'lodging', 'days_remain',     # or 'Unknown'
+            'checked_in',           # checked in date as yyyy-mm-dd, or ''
+            'last_day',             # expected release date as yyyy-mm-dd, or ''
+            'days_left',            # days from today to the expected release, or None
+            'is_checked_in', 'released',
+            )
+
+    def __init__(self, row, title_names, checked_in, last_day, days_left):
+        """ row - a roster row (anything indexable by column); title_names - column name > index
+
+            checked_in, last_day, days_left - this row's entries from the date columns, which
+                process_roster converts a whole column at a time (see excel_dates)
+        """
+
+        value = lambda title: row[title_names[title]]
+
+        self.name = value('Name')
+        self.first = get_first(self.name)
+        self.last = get_last(self.name)
+        self.email = value('Email')
+        self.cell_phone = value('Cell phone')
+        self.district = value('District')
+
+        self.sup = value('Current/Last Supervisor')
+        self.supervisor = get_supervisor(self.sup)
+        self.gap = format_gap(value('GAP(s)'))
+
+        self.location_type = get_unknown(value('Location type'))
+        self.work_location = get_unknown(value('Reporting/Work Location'))
+        self.lodging = get_unknown(value('Current lodging'))
+        self.days_remain = get_unknown(value('DaysRemain'))
+
+        self.is_checked_in = value('Checked in') != ''
+        self.checked_in = checked_in
+
+        self.last_day = last_day
+        self.days_left = days_left if days_left != excel_dates.NO_DATE else None
+
+        self.released = value('Released') != ''
+
+
+    def __repr__(self):
+        return f"Responder({ self.name !r}, gap={ self.gap !r}, sup={ self.sup !r})"
+
+
+
 def process_roster(ws, start_row, title_names, title_cols):
     """ process all the rows in the worksheet
 
-        ws - the worksheet
+        ws - the worksheet, as a report_table.ReportTable
         start_row - starting row of data in the ws (origin zero)
         title_names - dict mapping names to column numbers (origin zero)
         title_cols - dict mapping column numbers to column names (origin zero)
     """
 
     no_sups = []
-    sup_dict = {}   # keyed by sup name; contains an array of reporting people
-    name_dict = {}  # keyed by name; contains whole list
+    sup_dict = {}   # keyed by sup name; contains an array of reporting Responders
+    name_dict = {}  # keyed by name; contains the Responder
+
+    # convert the date columns in one go; a roster only has a handful of distinct dates.  The
+    # release dates are read as numbers() (the title and blank cells are NaN)
+    checked_in = excel_dates.format_dates(ws.columns[title_names['Checked in']])
+    release_col = ws.numbers(title_names['Expect release'])
+    last_day = excel_dates.format_dates(release_col)
+    days_left = excel_dates.day_offsets(release_col, datetime.date.today())
 
     nrows = ws.nrows
     row_num = start_row -1 # convert to origin zero
     while row_num < nrows -1:
         row_num += 1
 
-        row = ws.row_values(row_num)
-        row_dict = row_to_dict(row, title_cols)
+        row = ws.row(row_num)
+        person = Responder(row, title_names, checked_in[row_num], last_day[row_num], days_left[row_num])
 
-        #log.debug(f"row { row_num } values { row_dict }")
+        #log.debug(f"row { row_num } person { person }")
 
-        name = row_dict['Name']
-        gap = format_gap(row_dict['GAP(s)'])
-        sup = row_dict['Current/Last Supervisor']
-        released = row_dict['Released']
+        name = person.name
+        gap = person.gap
+        sup = person.sup
 
-        name_dict[name] = row_dict
+        name_dict[name] = person
 
         # handle folks no longer on the job
-        if released != '':
+        if person.released:
             #log.debug(f"row { row_num } person { name } has been released; skipping...")
             continue
 
@@ -272,7 +366,7 @@ def process_roster(ws, start_row, title_names, title_cols):
         if sup not in sup_dict:
             sup_dict[sup] = []
 
-        sup_dict[sup].append(row_dict)
+        sup_dict[sup].append(person)
 
         # DEBUG ONLY
         #if row_num >= 180:
@@ -281,24 +375,6 @@ def process_roster(ws, start_row, title_names, title_cols):
     return sup_dict, no_sups, name_dict
 
 
-ordinal_1900_01_01 = datetime.datetime(1900, 1, 1).toordinal()
-def excel_date_to_string(excel_date):
-    """ convert floating excel representation of date to yyyy-mm-dd string """
-
-    if excel_date == "":
-        return ""
-
-    dt = excel_to_dt(excel_date)
-
-    return dt.strftime('%Y-%m-%d')
-
-def excel_to_dt(excel_date):
-
-    dt = datetime.datetime.fromordinal(ordinal_1900_01_01 + int(excel_date) -2)
-
-    return dt
-
-
 gap_pattern = re.compile('.*,')
 def format_gap(gap):
     gap = re.sub(gap_pattern,'', gap)
@@ -314,14 +390,11 @@ def format_reports(name, sup_row, name_dict):
 
     output = [ f"{'Name':25s} { 'GAP':15s} { 'Checked in':12s} { 'Last Day':12s} {'Cell Phone':14s} { 'Email':30s}" ]
 
-    for row in sup_row:
+    for person in sup_row:
 
-        #plog.debug(f"name { row['Name'] } released: { row['Released'] }")
+        #plog.debug(f"name { person.name } released: { person.released }")
         # only add folks still on the DR
-        gap = format_gap(row['GAP(s)'])
-        checkin = excel_date_to_string(row['Checked in'])
-        lastday = excel_date_to_string(row['Expect release'])
-        output.append(f"{ row['Name']:25s} { gap:15s} { checkin:12s} { lastday:12s} { row['Cell phone']:14s} { row['Email']:30s}")
+        output.append(f"{ person.name:25s} { person.gap:15s} { person.checked_in:12s} { person.last_day:12s} { person.cell_phone:14s} { person.email:30s}")
 
     return "\r\n".join(output)
 
@@ -360,21 +433,21 @@ def generate_sups(wb, sups, name_dict, sheet_name):
     """ generate a sheet for those with direct reports """
 
     output_cols = [
-            { 'name': 'Name', 'width': 20, 'field': lambda x: name_dict[x]['Name'], },
-            { 'name': 'First', 'width': 20, 'field': lambda x: get_first(name_dict[x]['Name']), },
-            { 'name': 'Last', 'width': 20, 'field': lambda x: get_last(name_dict[x]['Name']), },
-            { 'name': 'Email', 'width': 30, 'field': lambda x: name_dict[x]['Email'] },
-            { 'name': 'Supervisor', 'width': 30, 'field': lambda x: get_supervisor(name_dict[x]['Current/Last Supervisor']) },
-            { 'name': 'Last Day', 'width': 30, 'field': lambda x: excel_date_to_string(name_dict[x]['Expect release']) },
-            { 'name': 'GAP', 'width': 30, 'field': lambda x: format_gap(name_dict[x]['GAP(s)']) },
-            { 'name': 'Location type', 'width': 30, 'field': lambda x: get_unknown(name_dict[x]['Location type']) },
-            { 'name': 'District', 'width': 30, 'field': lambda x: name_dict[x]['District'] },
-            { 'name': 'Work Location', 'width': 30, 'field': lambda x: get_unknown(name_dict[x]['Reporting/Work Location']) },
-            { 'name': 'Current lodging', 'width': 30, 'field': lambda x: get_unknown(name_dict[x]['Current lodging']) },
+            { 'name': 'Name', 'width': 20, 'field': lambda x: name_dict[x].name, },
+            { 'name': 'First', 'width': 20, 'field': lambda x: name_dict[x].first, },
+            { 'name': 'Last', 'width': 20, 'field': lambda x: name_dict[x].last, },
+            { 'name': 'Email', 'width': 30, 'field': lambda x: name_dict[x].email },
+            { 'name': 'Supervisor', 'width': 30, 'field': lambda x: name_dict[x].supervisor },
+            { 'name': 'Last Day', 'width': 30, 'field': lambda x: name_dict[x].last_day },
+            { 'name': 'GAP', 'width': 30, 'field': lambda x: name_dict[x].gap },
+            { 'name': 'Location type', 'width': 30, 'field': lambda x: name_dict[x].location_type },
+            { 'name': 'District', 'width': 30, 'field': lambda x: name_dict[x].district },
+            { 'name': 'Work Location', 'width': 30, 'field': lambda x: name_dict[x].work_location },
+            { 'name': 'Current lodging', 'width': 30, 'field': lambda x: name_dict[x].lodging },
             { 'name': 'Reports', 'width': 50, 'field': lambda x: format_reports(x, sups[x], name_dict), },
             ]
 
-    generate_sheet(wb, sups, output_cols, sheet_name)
+    return generate_sheet(wb, sups, output_cols, sheet_name)
 
 def generate_non_svs(wb, sups, name_dict, sheet_name):
     """ generate a sheet for those without direct reports """
@@ -389,85 +462,91 @@ def generate_non_svs(wb, sups, name_dict, sheet_name):
             continue
 
         # skip people not checked in
-        if val['Checked in'] == "":
+        if not val.is_checked_in:
             continue
 
         # skip people outprocessed
-        if val['Released'] != "":
+        if val.released:
             continue
 
         individuals[name] = val
 
     output_cols = [
-            { 'name': 'Name', 'width': 20, 'field': lambda x: name_dict[x]['Name'], },
-            { 'name': 'First', 'width': 20, 'field': lambda x: get_first(name_dict[x]['Name']), },
-            { 'name': 'Last', 'width': 20, 'field': lambda x: get_last(name_dict[x]['Name']), },
-            { 'name': 'Email', 'width': 30, 'field': lambda x: name_dict[x]['Email'] },
-            { 'name': 'Supervisor', 'width': 30, 'field': lambda x: get_supervisor(name_dict[x]['Current/Last Supervisor']) },
-            { 'name': 'Last Day', 'width': 30, 'field': lambda x: excel_date_to_string(name_dict[x]['Expect release']) },
-            { 'name': 'GAP', 'width': 30, 'field': lambda x: format_gap(name_dict[x]['GAP(s)']) },
-            { 'name': 'Work Location', 'width': 30, 'field': lambda x: get_unknown(name_dict[x]['Reporting/Work Location']) },
-            { 'name': 'Location type', 'width': 30, 'field': lambda x: get_unknown(name_dict[x]['Location type']) },
-            { 'name': 'Current lodging', 'width': 30, 'field': lambda x: get_unknown(name_dict[x]['Current lodging']) },
+            { 'name': 'Name', 'width': 20, 'field': lambda x: name_dict[x].name, },
+            { 'name': 'First', 'width': 20, 'field': lambda x: name_dict[x].first, },
+            { 'name': 'Last', 'width': 20, 'field': lambda x: name_dict[x].last, },
+            { 'name': 'Email', 'width': 30, 'field': lambda x: name_dict[x].email },
+            { 'name': 'Supervisor', 'width': 30, 'field': lambda x: name_dict[x].supervisor },
+            { 'name': 'Last Day', 'width': 30, 'field': lambda x: name_dict[x].last_day },
+            { 'name': 'GAP', 'width': 30, 'field': lambda x: name_dict[x].gap },
+            { 'name': 'Work Location', 'width': 30, 'field': lambda x: name_dict[x].work_location },
+            { 'name': 'Location type', 'width': 30, 'field': lambda x: name_dict[x].location_type },
+            { 'name': 'Current lodging', 'width': 30, 'field': lambda x: name_dict[x].lodging },
             ]
 
-    generate_sheet(wb, individuals, output_cols, sheet_name)
+    return generate_sheet(wb, individuals, output_cols, sheet_name)
 
 
-def generate_3days(wb, sups, name_dict, sheet_name):
+def generate_3days(wb, sups, name_dict, sheet_name, days_before_warning):
     """ add everyone with 3 or fewer days left on the job """
 
 
     short = {}
-    three_days = datetime.datetime.now() + datetime.timedelta(days=config.DAYS_BEFORE_WARNING)    # 3 days in the future
     for name, val in name_dict.items():
 
         # skip people not checked in
-        if val['Checked in'] == "":
+        if not val.is_checked_in:
             continue
 
         # skip people outprocessed
-        if val['Released'] != "":
+        if val.released:
             continue
 
-        out_date = excel_to_dt(val['Expect release'])
-        if out_date > three_days:
+        # days_left is whole days until the release date, so this is "released within days_before_warning days"
+        if val.days_left is None or val.days_left > days_before_warning:
             continue
 
         short[name] = val
 
     output_cols = [
-            { 'name': 'Name', 'width': 20, 'field': lambda x: name_dict[x]['Name'], },
-            { 'name': 'First', 'width': 15, 'field': lambda x: get_first(name_dict[x]['Name']), },
-            { 'name': 'Last', 'width': 15, 'field': lambda x: get_last(name_dict[x]['Name']), },
-            { 'name': 'Email', 'width': 30, 'field': lambda x: name_dict[x]['Email'] },
-            { 'name': 'Supervisor', 'width': 20, 'field': lambda x: get_supervisor(name_dict[x]['Current/Last Supervisor']) },
-            { 'name': 'Last Day', 'width': 12, 'field': lambda x: excel_date_to_string(name_dict[x]['Expect release']) },
-            { 'name': 'Days Remaining', 'width': 5, 'field': lambda x: get_unknown(name_dict[x]['DaysRemain']) },
-            { 'name': 'GAP', 'width': 15, 'field': lambda x: format_gap(name_dict[x]['GAP(s)']) },
-            { 'name': 'Work Location', 'width': 30, 'field': lambda x: get_unknown(name_dict[x]['Reporting/Work Location']) },
-            #{ 'name': 'Location type', 'width': 15, 'field': lambda x: get_unknown(name_dict[x]['Location type']) },
-            { 'name': 'Current lodging', 'width': 30, 'field': lambda x: get_unknown(name_dict[x]['Current lodging']) },
+            { 'name': 'Name', 'width': 20, 'field': lambda x: name_dict[x].name, },
+            { 'name': 'First', 'width': 15, 'field': lambda x: name_dict[x].first, },
+            { 'name': 'Last', 'width': 15, 'field': lambda x: name_dict[x].last, },
+            { 'name': 'Email', 'width': 30, 'field': lambda x: name_dict[x].email },
+            { 'name': 'Supervisor', 'width': 20, 'field': lambda x: name_dict[x].supervisor },
+            { 'name': 'Last Day', 'width': 12, 'field': lambda x: name_dict[x].last_day },
+            { 'name': 'Days Remaining', 'width': 5, 'field': lambda x: name_dict[x].days_remain },
+            { 'name': 'GAP', 'width': 15, 'field': lambda x: name_dict[x].gap },
+            { 'name': 'Work Location', 'width': 30, 'field': lambda x: name_dict[x].work_location },
+            #{ 'name': 'Location type', 'width': 15, 'field': lambda x: name_dict[x].location_type },
+            { 'name': 'Current lodging', 'width': 30, 'field': lambda x: name_dict[x].lodging },
             ]
 
-    generate_sheet(wb, short, output_cols, sheet_name)
+    return generate_sheet(wb, short, output_cols, sheet_name)
 
 
 
 
 def generate_sheet(wb, people, output_cols, sheet_name):
-    """ generate a row for each supervisor, with their direct reports and contact info """
+    """ generate a row for each supervisor, with their direct reports and contact info
+
+        returns (titles, rows): the column titles and each row's values, as written
+    """
 
     ws = wb.create_sheet(title=sheet_name)
 
     # generate the title row
+    titles = []
     for i, col_def in enumerate(output_cols):
         ws.cell(column=i+1, row=1, value=col_def['name'])
+        titles.append(col_def['name'])
         width = col_def['width']
         #log.debug(f"column { col_def['name'] } has width { width }")
         ws.column_dimensions[openpyxl.utils.get_column_letter(i+1)].width = col_def['width']
 
+    report_workbook.start_body(ws)
 
+    rows = []
     output_row = 1
     for name in sorted(people.keys()):
         output_row += 1
@@ -475,9 +554,10 @@ def generate_sheet(wb, people, output_cols, sheet_name):
 
         #log.debug(f"processing sup { name } len { len(sup_row) }")
 
-        for i, col_def in enumerate(output_cols):
-            value = col_def['field'](name)
+        values = [ col_def['field'](name) for col_def in output_cols ]
+        for i, value in enumerate(values):
             ws.cell(column=i+1, row=output_row, value=value)
+        rows.append(values)
 
     if output_row == 1:
         # special case to avoid empty tables
@@ -489,6 +569,8 @@ def generate_sheet(wb, people, output_cols, sheet_name):
     tab = table.Table(displayName=sheet_name, ref=ref)
     ws.add_table(tab)
 
+    return titles, rows
+
 
 def generate_no_sups(ws, no_sups, col_dict):
     """ add the no_sups info to the worksheet
@@ -519,6 +601,11 @@ def generate_no_sups(ws, no_sups, col_dict):
         ws.cell(column=col+1, row=1, value=val)
         #log.debug(f"setting title col { col + 1 } to { val }")
 
+    report_workbook.start_body(ws)
+
+    styles = report_styles.registry(ws.parent)
+    date_style = styles.named(number_format='yyyy-mm-dd')
+
     row_num = 1
     for row in no_sups:
         row_num += 1
@@ -529,19 +616,9 @@ def generate_no_sups(ws, no_sups, col_dict):
 
             # make sure date columns are formatted properly
             if col_num in date_column_cols:
-                out_cell.number_format = 'yyyy-mm-dd'
-
-
-
-
-def row_to_dict(row, title_cols):
-    """ convert a row of data into a dict mapping column name to value """
+                styles.apply(out_cell, date_style)
 
-    result = {}
-    for index, value in enumerate(row):
-        result[title_cols[index]] = value
 
-    return result
 
 
 def init_config():
@@ -573,8 +650,8 @@ def parse_args():
     parser.add_argument("--debug", help="turn on debugging output", action="store_true")
     parser.add_argument("--send", help="send emails to folks on the DR", action="store_true")
     parser.add_argument("--test-send", help="send emails to a test recipient", action="store_true")
-    parser.add_argument("--save-input", help="save a copy of the raw VC spreadsheets", action="store_true")
-    parser.add_argument("--cached-input", help="use the saved copies of the raw VC spreadsheets", action="store_true")
+    parser.add_argument("--save-input", help="obsolete: the raw VC spreadsheets are always kept in the report cache", action="store_true")
+    parser.add_argument("--cached-input", help="use the report cache copies of the raw VC spreadsheets, however old", action="store_true")
     parser.add_argument("--save-output", help="don't delete output spreadsheets", action="store_true")
     parser.add_argument("--sups", help="generate the supervisors emails", action="store_true")
     parser.add_argument("--responders", help="generate the responders (non-sups) emails", action="store_true")
@@ -0,0 +1,189 @@
+#! /usr/bin/env python3
+
+# sheet_plan -- compile a report's params into per-column work for the copy loop
+
+import logging
+
+log = logging.getLogger(__name__)
+
+
+class ColumnPlan:
+    """ everything the copy loop does for one output column, worked out before the first row
+
+        values - the input column (a list indexed by input row); columns that aren't in the
+                input (inserted columns) get their column_values, or a column of ''s
+        number_format, alignment - applied to every body cell, or None
+        style - if the plan was compiled with a style registry, the name of the named style that
+                has this column's number_format and alignment; it's applied instead of them
+        actions - functions called as action(cell, in_row_index) on every body cell, in order
+    """
+
+    __slots__ = ('name', 'out_col', 'values', 'number_format', 'actions', 'alignment', 'style')
+
+    def __init__(self, name, out_col, values):
+        self.name = name
+        self.out_col = out_col
+        self.values = values
+        self.number_format = None
+        self.actions = ()
+        self.alignment = None
+        self.style = None
+
+
+    def __repr__(self):
+        return f"ColumnPlan({ self.name !r}, out_col={ self.out_col }, actions={ len(self.actions) })"
+
+
+
+def compile_plan(in_columns, in_column_map, out_column_map, params, in_colours=None, in_links=None, styles=None):
+    """ turn the column settings in params into a list of ColumnPlans, in output column order
+
+        in_columns - the input table's columns (ReportTable.columns)
+        in_column_map, out_column_map - column name > input column / output column, as made
+                by process_title_row
+        params - the report params; uses column_formats, column_fills, column_row_fills,
+                column_alignments, column_colors, hyperlink_convert and column_values, any of
+                which may be missing.  column_values maps an inserted column's name to its
+                values, indexed by input row.  column_row_fills maps a column name to a function
+                that is given the whole column once and returns each input row's fill (or None)
+        in_colours - column name > font colour by row, for the column_colors columns
+        in_links - column name > url (or None) by row, for the hyperlink_convert columns
+        styles - the output workbook's report_styles.StyleRegistry; if given, each column's
+                number format and alignment become one named style (pass it to write_rows too)
+
+        Per cell, the work is done in the same order as the old loop did it: number format,
+        fill (column_fills, then column_row_fills), colour, hyperlink, then alignment.  With
+        styles, the number format and alignment are both applied first, as the column's named
+        style.
+    """
+
+    col_format = params.get('column_formats', {})
+    col_fills = params.get('column_fills', {})
+    col_row_fills = params.get('column_row_fills', {})
+    col_alignment = params.get('column_alignments', {})
+    col_colors = params.get('column_colors', {})
+    col_hyperlink = params.get('hyperlink_convert', {})
+    col_values = params.get('column_values', {})
+    in_colours = in_colours if in_colours is not None else {}
+    in_links = in_links if in_links is not None else {}
+
+    nrows = len(in_columns[0]) if len(in_columns) > 0 else 0
+
+    plan = []
+    for col_name, out_col in out_column_map.items():
+        if col_name in in_column_map:
+            values = in_columns[in_column_map[col_name]]
+        elif col_name in col_values:
+            values = col_values[col_name]
+        else:
+            values = [ '' ] * nrows
+
+        column = ColumnPlan(col_name, out_col, values)
+        column.number_format = col_format.get(col_name)
+        column.alignment = col_alignment.get(col_name)
+        if styles is not None and (column.number_format is not None or column.alignment is not None):
+            column.style = styles.named(number_format=column.number_format, alignment=column.alignment)
+
+        actions = []
+        if col_name in col_fills:
+            actions.append(fill_action(col_fills[col_name]))
+
+        if col_name in col_row_fills:
+            actions.append(row_fill_action(col_row_fills[col_name](values), styles))
+
+        if col_name in in_colours:
+            actions.append(colour_action(col_colors[col_name], in_colours[col_name]))
+
+        if col_name in in_links:
+            actions.append(link_action(col_hyperlink[col_name], in_links[col_name]))
+
+        column.actions = tuple(actions)
+        plan.append(column)
+
+    return plan
+
+
+def fill_action(func):
+    """ column_fills functions just take the cell """
+    return lambda cell, in_row_index: func(cell)
+
+
+def row_fill_action(fills, styles):
+    """ fills worked out for the whole column up front, looked up by input row """
+
+    def action(cell, in_row_index):
+        fill = fills[in_row_index]
+        if fill is not None:
+            if styles is not None:
+                styles.add(cell, fill=fill)
+            else:
+                cell.fill = fill
+
+    return action
+
+
+def colour_action(func, colours):
+    """ column_colors functions get the input cell's font colour """
+    return lambda cell, in_row_index: func(cell, colours[in_row_index])
+
+
+def link_action(func, links):
+    """ hyperlink_convert functions get the input cell's url, if it has one """
+
+    def action(cell, in_row_index):
+        url = links[in_row_index]
+        if url != None:
+            func(cell, url)
+
+    return action
+
+
+def write_title_row(out_ws, out_row, plan):
+    """ write the column names, aligned like the rest of their column """
+
+    for column in plan:
+        cell = out_ws.cell(row=out_row, column=column.out_col, value=column.name)
+        if column.alignment is not None:
+            cell.alignment = column.alignment
+
+
+def write_rows(out_ws, out_row, plan, in_rows, styles=None):
+    """ copy each input row in in_rows to out_ws, starting at out_row, doing each column's planned work
+
+        styles - the StyleRegistry the plan was compiled with, if any
+
+        returns the last output row written (out_row -1 if in_rows is empty)
+    """
+
+    # unpack the plan into tuples and bind the cell method once; this is the hot loop
+    # a column with a named style gets it in one step, before its actions (which may add a fill)
+    steps = []
+    for column in plan:
+        if column.style is not None:
+            steps.append((column.out_col, column.values, column.style, None, column.actions, None))
+        else:
+            steps.append((column.out_col, column.values, None, column.number_format, column.actions, column.alignment))
+
+    new_cell = out_ws.cell
+    apply_style = styles.apply if styles is not None else None
+
+    out_row -= 1
+    for in_row_index in in_rows:
+        out_row += 1
+
+        for out_col, values, style, number_format, actions, alignment in steps:
+            cell = new_cell(row=out_row, column=out_col, value=values[in_row_index])
+
+            if style is not None:
+                apply_style(cell, style)
+            elif number_format is not None:
+                cell.number_format = number_format
+
+            if actions:
+                for action in actions:
+                    action(cell, in_row_index)
+
+            if alignment is not None:
+                cell.alignment = alignment
+
+    return out_row
@@ -2,19 +2,19 @@
 
 import os
 import re
-import io
 import sys
+import tempfile
 import logging
 import argparse
 import datetime
 
-import xlrd
 import dotenv
 import O365
 
 import init_logging
 import config as config_static
 import roster
+import report_table
 
 
 log = logging.getLogger(__name__)
@@ -139,27 +139,28 @@ def test_storage(account, drive_id, config):
 
 
 def convert(folder, entry, new_name, config):
-    input_io = io.BytesIO()
-    entry.download(output=input_io)
+    """ convert a roster xls in onedrive to a staffing xlsx next to it
 
-    input_buffer = input_io.getvalue()
-    input_io.close()
+        The input is streamed to a temp file and parsed from there (memory mapped, only the
+        first sheet loaded) and the output is saved to a temp file and uploaded from it, so
+        neither spreadsheet is ever held in memory as a whole.
+    """
 
-    input_wb = xlrd.open_workbook(file_contents=input_buffer)
-    input_buffer = None
+    with tempfile.TemporaryDirectory(prefix='sync-') as temp_dir:
+        input_file = os.path.join(temp_dir, 'input.xls')
+        with open(input_file, 'wb') as fh:
+            entry.download(output=fh)
 
-    output_wb = roster.make_workbook(input_wb, config)
+        input_table = report_table.open_table(input_file)
 
-    output_io = io.BytesIO()
-    output_wb.save(output_io)
-    output_buffer = output_io.getvalue()
-    output_io.close()
+        output_wb, sheet_data = roster.make_workbook(input_table, config)
+        input_table = None
 
-    stream_io = io.BytesIO(output_buffer)
-    stream_len = len(output_buffer)
-    output_buffer = None
+        output_file = os.path.join(temp_dir, new_name)
+        output_wb.save(output_file)
+        output_wb = None
 
-    new_file = folder.upload_file(None, stream=stream_io, stream_size=stream_len, item_name=new_name)
+        new_file = folder.upload_file(output_file, item_name=new_name)
 
     log.info(f"uploaded { new_file.name }: modified { new_file.modified } by { new_file.modified_by }")
 
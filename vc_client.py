@@ -0,0 +1,369 @@
+#! /usr/bin/env python3
+
+# vc_client -- run Volunteer Connection ClearReports queries and download the results
+
+import re
+import time
+import html
+import random
+import logging
+import threading
+import urllib.parse
+
+import requests
+import requests.adapters
+
+from vc_session import ScrapeException, VC_URL
+
+log = logging.getLogger(__name__)
+
+
+# report downloads are copied to disk this many bytes at a time
+DOWNLOAD_CHUNK_SIZE = 256 * 1024
+
+# while a download is running, log how far it has got every this many seconds
+DOWNLOAD_PROGRESS_INTERVAL = 5
+
+# how long to wait for a connection to open, as opposed to a report to be generated
+CONNECT_TIMEOUT = 15
+
+# the first <a href=...> in the clearreports_auth response is the link to the finished report
+RE_FIRST_HREF = re.compile(r'''<a\s[^>]*?href\s*=\s*["']([^"']+)["']''', re.IGNORECASE)
+
+
+HEADERS = {
+        #'accept': 'application/json, text/javascript, */*; q=0.01',
+        'accept': '*/*',
+        'accept-language': 'en-US,en;q=0.9',
+        'content-type': 'application/x-www-form-urlencoded; charset=UTF-8',
+        'DNT': '1',
+        'Host': 'volunteerconnection.redcross.org',
+        'Origin': 'https://volunteerconnection.redcross.org',
+        'Referer': 'https://volunteerconnection.redcross.org/',
+        'Sec-Fetch-Dest': 'empty',
+        'Sec-Fetch-Mode': 'cors',
+        'Sec-Fetch-Site': 'same-origin',
+        'sec-gpc': '1',
+        'User-Agent': '.Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/86.0.4240.75 Safari/537.36',
+        'X-Requested-With': 'XMLHttpRequest',
+        }
+
+# the availability reports launch as a page navigation rather than an xhr
+NAVIGATE_HEADERS = {
+        'Sec-Fetch-Dest': 'document',
+        'Sec-Fetch-Mode': 'navigate',
+        }
+
+
+class SessionExpired(ScrapeException):
+    """ VC sent its login page instead of an answer: polling or retrying won't help """
+    pass
+
+
+
+class ReportNotReady(ScrapeException):
+    """ a real VC page, but without the report link yet """
+    pass
+
+
+
+class ReportTimeout(ScrapeException):
+    """ reports weren't ready by the deadline; the jobs stay with the client to be resumed """
+
+    def __init__(self, message, jobs):
+        super().__init__(message)
+        self.jobs = jobs
+
+
+
+class VCClient:
+    """ a Volunteer Connection report client
+
+        Wraps an authenticated requests session (from vc_session.get_session) with a keep-alive
+        connection pool big enough for pool_size reports to be fetched in parallel.  One client
+        is meant to be shared by all the fetch threads.
+    """
+
+    def __init__(self, session, config, pool_size=4):
+        self.session = session
+        self.config = config
+        self.retries = config.VC_RETRIES
+        self.backoff = config.VC_RETRY_BACKOFF
+
+        adapter = requests.adapters.HTTPAdapter(pool_connections=1, pool_maxsize=pool_size, max_retries=0)
+        session.mount('https://', adapter)
+        session.mount('http://', adapter)
+
+        # polled jobs that ran past their deadline, keyed by job_key(); resumed, not relaunched
+        self.pending_jobs = {}
+        self.pending_lock = threading.Lock()
+
+
+    def download_report(self, params0, params1, fh, timeout=None, extra_headers=None):
+        """ launch a ClearReports query and stream the result into fh
+
+            params0 - params for the clearreports_launch_admin post
+            params1 - params for the clearreports_auth post
+            fh - binary file handle to write to; it is rewound and truncated if we have to retry
+            timeout - seconds to wait for VC to respond to each request (default config.WEB_TIMEOUT)
+            extra_headers - headers to add to (or override) the standard HEADERS
+
+            Network errors, timeouts and server errors are retried config.VC_RETRIES times with
+            jittered exponential backoff.  A page we can't use (the login page, or no report
+            link) is not: it won't get better by asking again.  Returns the number of bytes written.
+        """
+
+        if timeout == None:
+            timeout = self.config.WEB_TIMEOUT
+
+        headers = HEADERS
+        if extra_headers is not None:
+            headers = dict(HEADERS, **extra_headers)
+
+        attempt = 0
+        while True:
+            try:
+                return self._download_report(params0, params1, fh, timeout, headers)
+            except (requests.ConnectionError, requests.Timeout, requests.HTTPError) as e:
+                if not self._retryable(e) or attempt >= self.retries:
+                    raise
+
+                delay = self.backoff * (2 ** attempt) * random.uniform(0.5, 1.5)
+                attempt += 1
+                log.warning(f"report { params0['query_id'] } failed ({ e }); retry { attempt } of { self.retries } in { delay:.1f}s")
+                time.sleep(delay)
+
+                fh.seek(0)
+                fh.truncate()
+
+
+    def _download_report(self, params0, params1, fh, timeout, headers):
+        """ one try at the launch / auth / download sequence """
+
+        timeouts = (CONNECT_TIMEOUT, timeout)
+
+        #log.debug(f"params0 { params0 } params1 { params1 }")
+        response = self.session.post(VC_URL, data=params0, headers=headers, timeout=timeouts)
+        response.raise_for_status()
+        check_logged_in(response, f"report { params0['query_id'] }")
+
+        response = self.session.post(VC_URL, data=params1, headers=headers, timeout=timeouts)
+        response.raise_for_status()
+        check_logged_in(response, f"report { params0['query_id'] }")
+
+        url2 = urllib.parse.urljoin(VC_URL, find_report_link(response.text))
+        log.debug(f"url2 { url2 }")
+
+        with self.session.get(url2, timeout=timeouts, stream=True) as response:
+            response.raise_for_status()
+            return save_response(response, fh)
+
+
+    def poll_reports(self, requests_list, deadline=None, extra_headers=None):
+        """ run several slow reports at once: launch each, then poll until they are all ready
+
+            requests_list - list of (params0, params1, fh) tuples
+            deadline - seconds from now to give up (default config.VC_REPORT_DEADLINE)
+
+            Every network call made here is short (config.VC_POLL_TIMEOUT), so one thread can keep
+            any number of reports in flight.  Polls back off from config.VC_POLL_INTERVAL up to
+            config.VC_POLL_MAX_INTERVAL.
+
+            If the deadline passes, ReportTimeout is raised and the unfinished jobs are kept on the
+            client.  Asking for the same reports again picks those jobs up where they left off
+            instead of launching the queries a second time.
+        """
+
+        if deadline == None:
+            deadline = self.config.VC_REPORT_DEADLINE
+        give_up = time.monotonic() + deadline
+
+        headers = HEADERS
+        if extra_headers is not None:
+            headers = dict(HEADERS, **extra_headers)
+
+        active = []
+        with self.pending_lock:
+            for params0, params1, fh in requests_list:
+                job = self.pending_jobs.pop(job_key(params1), None)
+                if job is None:
+                    job = ReportJob(self, params0, params1, fh, headers)
+                else:
+                    log.debug(f"resuming report { job.query_id } in state '{ job.state }'")
+                    job.resume(fh)
+                active.append(job)
+
+        while len(active) > 0:
+            job = min(active, key=lambda j: j.next_poll)
+
+            now = time.monotonic()
+            if now >= give_up:
+                with self.pending_lock:
+                    for job in active:
+                        self.pending_jobs[job_key(job.params1)] = job
+                names = ", ".join(job.query_id for job in active)
+                raise ReportTimeout(f"reports { names } not ready after { deadline }s", active)
+
+            wait = job.next_poll - now
+            if wait > 0:
+                time.sleep(min(wait, give_up - now))
+                continue
+
+            if job.step():
+                active.remove(job)
+
+
+    def _retryable(self, e):
+        """ client errors (4xx) won't get better by trying again; everything else might """
+        if isinstance(e, requests.HTTPError) and e.response is not None:
+            return e.response.status_code >= 500
+        return True
+
+
+
+class ReportJob:
+    """ one ClearReports query, launched once and then polled until the download link shows up
+
+        Each call to step() does one short piece of work (launch, poll or download) and
+        schedules the next one in next_poll, so a single thread can drive many jobs.
+    """
+
+    def __init__(self, client, params0, params1, fh, headers):
+        self.client = client
+        self.config = client.config
+        self.params0 = params0
+        self.params1 = params1
+        self.query_id = params0['query_id']
+        self.fh = fh
+        self.headers = headers
+
+        self.state = 'new'          # new -> launched -> ready -> done
+        self.href = None
+        self.errors = 0
+        self.interval = self.config.VC_POLL_INTERVAL
+        self.next_poll = time.monotonic()
+
+
+    def resume(self, fh):
+        """ pick the job back up after a timeout, writing to a new file handle """
+        self.fh = fh
+        self.errors = 0
+        self.interval = self.config.VC_POLL_INTERVAL
+        self.next_poll = time.monotonic()
+        if self.state == 'done':
+            self.state = 'ready'
+
+
+    def step(self):
+        """ do the next piece of work; returns True once the report has been downloaded """
+
+        session = self.client.session
+        timeouts = (CONNECT_TIMEOUT, self.config.VC_POLL_TIMEOUT)
+
+        try:
+            if self.state == 'new':
+                try:
+                    response = session.post(VC_URL, data=self.params0, headers=self.headers, timeout=timeouts)
+                    response.raise_for_status()
+                except requests.ReadTimeout:
+                    # VC has the request and is busy building the report; go on to polling
+                    log.debug(f"report { self.query_id } launch is still running; polling for it")
+
+                self.state = 'launched'
+                self.next_poll = time.monotonic()
+                return False
+
+            if self.state == 'launched':
+                try:
+                    response = session.post(VC_URL, data=self.params1, headers=self.headers, timeout=timeouts)
+                    response.raise_for_status()
+
+                    # a logged out session gets the login page, which never has the link; stop now
+                    # rather than polling it until the deadline
+                    check_logged_in(response, f"report { self.query_id }")
+                    self.href = find_report_link(response.text)
+                except (requests.ReadTimeout, ReportNotReady):
+                    log.debug(f"report { self.query_id } not ready; next poll in { self.interval }s")
+                    self._backoff()
+                    return False
+
+                self.state = 'ready'
+
+            # state is 'ready': the download itself gets the normal (long) timeout
+            url2 = urllib.parse.urljoin(VC_URL, self.href)
+            log.debug(f"url2 { url2 }")
+
+            self.fh.seek(0)
+            self.fh.truncate()
+            with session.get(url2, timeout=(CONNECT_TIMEOUT, self.config.WEB_TIMEOUT), stream=True) as response:
+                response.raise_for_status()
+                save_response(response, self.fh)
+
+            self.state = 'done'
+            return True
+
+        except (requests.ConnectionError, requests.Timeout, requests.HTTPError) as e:
+            self.errors += 1
+            if not self.client._retryable(e) or self.errors > self.client.retries:
+                raise
+
+            log.warning(f"report { self.query_id } { self.state }: { e }; trying again in { self.interval }s")
+            self._backoff()
+            return False
+
+
+    def _backoff(self):
+        self.next_poll = time.monotonic() + self.interval * random.uniform(0.8, 1.2)
+        self.interval = min(self.interval * 2, self.config.VC_POLL_MAX_INTERVAL)
+
+
+
+def job_key(params1):
+    """ what makes two report jobs the same job """
+    return tuple(sorted((name, str(value)) for name, value in params1.items()))
+
+
+def check_logged_in(response, what):
+    """ raise SessionExpired if VC answered with its login form """
+
+    if 'sso-login-form' in response.text:
+        raise SessionExpired(f"{ what }: Volunteer Connection sent the login page; the session has expired")
+
+
+def find_report_link(text):
+    """ pull the href of the first anchor out of a clearreports_auth response
+
+        raises ReportNotReady if there isn't one
+    """
+
+    match = RE_FIRST_HREF.search(text)
+    if match is None:
+        raise ReportNotReady("no report link in clearreports_auth response")
+
+    return html.unescape(match.group(1))
+
+
+def save_response(response, fh):
+    """ copy a streamed (stream=True) response body into fh a chunk at a time
+
+        The body is never held in memory as a whole.  Progress is logged every
+        DOWNLOAD_PROGRESS_INTERVAL seconds.  Returns the number of bytes written.
+    """
+
+    start = time.monotonic()
+    next_progress = start + DOWNLOAD_PROGRESS_INTERVAL
+    size = 0
+    for chunk in response.iter_content(chunk_size=DOWNLOAD_CHUNK_SIZE):
+        fh.write(chunk)
+        size += len(chunk)
+
+        now = time.monotonic()
+        if now >= next_progress:
+            next_progress = now + DOWNLOAD_PROGRESS_INTERVAL
+            log.debug(f"retrieving document.  { size } bytes so far, { now - start:.1f}s, { size / (now - start) / 1024:.0f} KB/s")
+
+    elapsed = time.monotonic() - start
+    rate = size / elapsed / 1024 if elapsed > 0 else 0
+    log.debug(f"retrieved document.  size is { size }, { elapsed:.1f}s, { rate:.0f} KB/s, type is '{ response.headers.get('content-type') }'")
+
+    return size
@@ -0,0 +1,48 @@
+#! /usr/bin/env python3
+
+# vc_fetch -- run several Volunteer Connection report downloads at once
+
+import logging
+import concurrent.futures
+
+log = logging.getLogger(__name__)
+
+
+# how many reports we will have in flight at once if the caller doesn't say
+DEFAULT_WORKERS = 4
+
+
+def fetch_reports(jobs, max_workers=DEFAULT_WORKERS):
+    """ launch every report fetch at once and hand back each report as soon as it arrives
+
+        jobs - dict mapping a job name to a function of no args that returns the report contents
+        max_workers - upper bound on the number of reports being fetched at the same time
+
+        This is a generator: it yields (name, contents) tuples in completion order, so the
+        caller can start processing one report while the slower ones are still downloading.
+        Processing happens on the caller's thread; only the downloads run on the pool.
+
+        An exception in any fetch is re-raised in the caller when that job is reached; the
+        remaining fetches are cancelled (if they haven't started) before it propagates.
+    """
+
+    if len(jobs) == 0:
+        return
+
+    workers = max(1, min(max_workers, len(jobs)))
+    log.debug(f"fetching { len(jobs) } reports with { workers } workers")
+
+    with concurrent.futures.ThreadPoolExecutor(max_workers=workers, thread_name_prefix='vc_fetch') as executor:
+        futures = {}
+        for name, func in jobs.items():
+            futures[executor.submit(func)] = name
+
+        try:
+            for future in concurrent.futures.as_completed(futures):
+                name = futures[future]
+                contents = future.result()
+                log.debug(f"report { name } arrived")
+                yield name, contents
+        finally:
+            for future in futures:
+                future.cancel()
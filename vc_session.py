@@ -15,18 +15,17 @@ import io
 import csv
 import sys
 import random
+import threading
+import contextlib
+import fcntl
+import html.parser
+import urllib.parse
 
 import requests
-import requests_html
 
 from http.cookiejar import LWPCookieJar, Cookie
 
-
-from selenium import webdriver
-from selenium.webdriver.common.keys import Keys
-from selenium.webdriver.common.by import By
-from selenium.webdriver.support.ui import WebDriverWait
-from selenium.webdriver.support import expected_conditions as EC
+# selenium is only imported when we actually have to log in: it is slow to load
 
 log = logging.getLogger(__name__)
 
@@ -36,30 +35,50 @@ class ScrapeException(Exception):
 
 
 
+VC_URL = "https://volunteerconnection.redcross.org/"
+
+# where a logged in user lands; fetching it is our cheap "are we still logged in?" probe
+VC_HOME_URL = VC_URL + "?nd=m_home"
+
+# the background login started by get_session, if any
+_refresh_thread = None
+
+
 def get_session(config, session=None):
+    """ return a requests session logged into Volunteer Connection
+
+        Saved cookies are checked with one cheap page fetch before we trust them; if they no
+        longer work we log in again right away.  If they work but the login is due to expire
+        within config.VC_SESSION_REFRESH_MARGIN seconds, a fresh login is started in the
+        background and its cookies are swapped into the session when it finishes, so the
+        report fetches never wait on a browser.
+    """
 
     cookies = None
+    seen_mtime = _cookie_mtime(config)
 
     if session == None:
-        try:
-            cookies = LWPCookieJar(config.COOKIE_FILE)
-            #log.debug("before cookie load")
-            cookies.load(ignore_discard=True, ignore_expires=True);
-            #log.debug("after cookie load")
-        except:
-            # couldn't read the file; generate new
-            log.debug("exception during cookie load")
-            cookies = None
+        session = requests.Session()
+        cookies = _load_cookies(config)
 
-    if cookies == None:
-        cookies = _refresh_cookies_using_selenium(config)
+        if cookies != None:
+            session.cookies = cookies
+            if not probe_session(session, config):
+                log.info("saved Volunteer Connection login no longer works; logging in again")
+                cookies = None
 
     if cookies == None:
-        log.fatal("Could not log into volunteer connection")
-        sys.exit(1)
+        cookies = _login(config, seen_mtime)
 
-    if session == None:
-        session = requests_html.HTMLSession()
+        if cookies == None:
+            log.fatal("Could not log into volunteer connection")
+            sys.exit(1)
+
+    else:
+        time_left = session_time_left(cookies, config)
+        log.debug(f"Volunteer Connection login has { int(time_left) }s left")
+        if time_left < config.VC_SESSION_REFRESH_MARGIN:
+            _start_background_refresh(session, config)
 
     session.cookies = cookies
 
@@ -68,10 +87,238 @@ def get_session(config, session=None):
     return session
 
 
+def probe_session(session, config):
+    """ check that the session is really logged in: VC sends logged out users to the login form """
+
+    try:
+        response = session.get(VC_HOME_URL, timeout=config.WEB_TIMEOUT)
+        response.raise_for_status()
+    except requests.RequestException as e:
+        # can't tell; don't start a browser over a network hiccup
+        log.warning(f"could not check Volunteer Connection login: { e }")
+        return True
+
+    valid = 'nd=m_home' in response.url and 'sso-login-form' not in response.text
+    log.debug(f"login probe: url { response.url } valid { valid }")
+    return valid
+
+
+def session_time_left(cookies, config):
+    """ seconds until the saved login expires
+
+        That is the earliest real cookie expiry we recorded at login (see
+        requests_session_with_selenium_cookies), capped at config.VC_SESSION_LIFETIME after
+        the cookie file was written.
+    """
+
+    expires = (_cookie_mtime(config) or time.time()) + config.VC_SESSION_LIFETIME
+
+    for cookie in cookies:
+        vc_expires = cookie.get_nonstandard_attr('vc_expires')
+        if vc_expires:
+            expires = min(expires, int(vc_expires))
+
+    return expires - time.time()
+
+
+def _start_background_refresh(session, config):
+    """ log in again on a background thread; the session keeps its current cookies until then """
+
+    global _refresh_thread
+
+    if _refresh_thread is not None and _refresh_thread.is_alive():
+        return
+
+    seen_mtime = _cookie_mtime(config)
+
+    def refresh():
+        try:
+            cookies = _login(config, seen_mtime)
+        except Exception as e:
+            log.warning(f"background Volunteer Connection login failed: { e }")
+            return
+
+        if cookies != None:
+            session.cookies = cookies
+            log.info("refreshed Volunteer Connection login in the background")
+
+    log.info("Volunteer Connection login expires soon; refreshing it in the background")
+    _refresh_thread = threading.Thread(target=refresh, name="vc_login_refresh")
+    _refresh_thread.start()
+
+
+def _login(config, seen_mtime):
+    """ log into VC, unless another process did it while we waited our turn
+
+        The scripts run from cron close together and share COOKIE_FILE.  Logins are serialized
+        with a lock file next to it, so only one browser runs at a time; whoever gets the lock
+        after someone else has logged in just picks up the cookies they saved.
+
+        seen_mtime - the cookie file's mtime when we decided we needed a login (None if there
+                was no file); a different mtime once we hold the lock means a new login landed
+    """
+
+    with _login_lock(config):
+        mtime = _cookie_mtime(config)
+        if mtime is not None and mtime != seen_mtime:
+            cookies = _load_cookies(config)
+            if cookies != None:
+                log.info("another process just logged into Volunteer Connection; using its cookies")
+                return cookies
+
+        return _refresh_cookies(config)
+
+
+def _refresh_cookies(config):
+    """ log in the cheapest way that works: a plain HTTP form post, then a browser """
+
+    if config.VC_LOGIN_METHOD == 'http':
+        try:
+            return _refresh_cookies_using_http(config)
+        except (requests.RequestException, ScrapeException) as e:
+            log.warning(f"HTTP login failed ({ e }); falling back to selenium")
+
+    return _refresh_cookies_using_selenium(config)
+
+
+@contextlib.contextmanager
+def _login_lock(config):
+    """ hold the cross-process login lock (an flock on COOKIE_FILE.lock) """
+
+    with open(config.COOKIE_FILE + '.lock', 'a') as fh:
+        log.debug("waiting for the VC login lock")
+        fcntl.flock(fh, fcntl.LOCK_EX)
+        try:
+            yield
+        finally:
+            fcntl.flock(fh, fcntl.LOCK_UN)
+
+
+def _load_cookies(config):
+    """ the saved cookie jar, or None if there isn't a usable one """
+
+    try:
+        cookies = LWPCookieJar(config.COOKIE_FILE)
+        #log.debug("before cookie load")
+        cookies.load(ignore_discard=True, ignore_expires=True);
+        #log.debug("after cookie load")
+    except:
+        # couldn't read the file; generate new
+        log.debug("exception during cookie load")
+        cookies = None
+
+    return cookies
+
+
+def _save_cookies(cookies, config):
+    """ write the cookie jar to COOKIE_FILE in one step, so other processes never read half of it """
+
+    temp_file = f"{ config.COOKIE_FILE }.{ os.getpid() }.tmp"
+    cookies.save(temp_file, ignore_discard=True, ignore_expires=True)
+    os.replace(temp_file, config.COOKIE_FILE)
+
+
+def _cookie_mtime(config):
+    try:
+        return os.path.getmtime(config.COOKIE_FILE)
+    except OSError:
+        return None
+
+
+
+def _refresh_cookies_using_http(config, session=None):
+    """ log in by posting the SSO login form ourselves: no browser needed
+
+        session - the requests session to log in with (a new one by default)
+
+        Raises ScrapeException if the login page doesn't look the way we expect or we don't
+        end up on the VC home page.
+    """
+    log.debug("refreshing authorization cookies via http")
+
+    if session == None:
+        session = requests.Session()
+
+    response = session.get(config.VC_LOGIN_URL, timeout=config.WEB_TIMEOUT)
+    response.raise_for_status()
+
+    parser = LoginFormParser()
+    parser.feed(response.text)
+    parser.close()
+
+    if parser.action == None or parser.email_field == None or parser.pass_field == None:
+        raise ScrapeException(f"no SSO login form at { response.url }")
+
+    fields = dict(parser.fields)
+    fields[parser.email_field] = config['SCRAPE_USER']
+    fields[parser.pass_field] = config['SCRAPE_PASS']
+
+    action = urllib.parse.urljoin(response.url, parser.action)
+    log.debug(f"posting login form to { action }")
+    response = session.post(action, data=fields, timeout=config.WEB_TIMEOUT * 2)
+    response.raise_for_status()
+
+    if '?nd=m_home' not in response.url:
+        raise ScrapeException(f"login did not reach the VC home page (ended at { response.url })")
+
+    cookies = LWPCookieJar(config.COOKIE_FILE)
+    for c in session.cookies:
+        cookies.set_cookie(_saved_cookie(c.name, c.value, c.domain, c.path, c.secure, c.expires,
+            c.has_nonstandard_attr('HttpOnly') or c.has_nonstandard_attr('httponly')))
+
+    _save_cookies(cookies, config)
+    return cookies
+
+
+
+class LoginFormParser(html.parser.HTMLParser):
+    """ pick the SSO login form out of the VC login page
+
+        After feed(), action is the form's action, fields its hidden (and other pre-filled)
+        inputs, and email_field / pass_field the names of the inputs to put the login in.
+    """
+
+    def __init__(self):
+        super().__init__()
+        self.action = None
+        self.fields = []
+        self.email_field = None
+        self.pass_field = None
+        self.in_form = False
+
+
+    def handle_starttag(self, tag, attrs):
+        attrs = dict(attrs)
+        classes = (attrs.get('class') or '').split()
+
+        if tag == 'form' and self.action == None and 'sso-login-form' in classes:
+            self.in_form = True
+            self.action = attrs.get('action') or ''
+            return
+
+        if tag != 'input' or not self.in_form or not attrs.get('name'):
+            return
+
+        name = attrs['name']
+        if 'sso-login-form-input-email' in classes:
+            self.email_field = name
+        elif 'sso-login-form-input-pass' in classes or attrs.get('type') == 'password':
+            self.pass_field = name
+        elif attrs.get('type') not in ('submit', 'button', 'checkbox', 'radio'):
+            self.fields.append((name, attrs.get('value') or ''))
+
+
+    def handle_endtag(self, tag):
+        if tag == 'form':
+            self.in_form = False
+
+
 
 def _refresh_cookies_using_selenium(config):
     log.debug("refreshing authorization cookies via selenium")
 
+    from selenium import webdriver
+
     selenium_driver_type = "chrome"
 
     if selenium_driver_type == "chrome":
@@ -128,6 +375,9 @@ def get_login_selenium(driver, config, user, password):
     Do the Volunteer Connection login dance in selenium
     """
 
+    from selenium.webdriver.support.ui import WebDriverWait
+    from selenium.webdriver.support import expected_conditions as EC
+
     driver.get("https://volunteerconnection.redcross.org")
 
     # wait for redirects to complete
@@ -175,40 +425,52 @@ def requests_session_with_selenium_cookies(driver, config):
     for c in selenium_cookies:
         log.debug(f"selenium cookie: { c }")
 
-        path = c['path']
-        path_specified = path != None
-
-        domain = c['domain']
-        domain_specified = domain != None
-        domain_initial_dot = domain_specified and domain[0] == '.'
-
-        if 'expiry' in c:
-            expires = c['expiry'] + 86400 * 365 * 10 # add 10 years to expiry
-        else:
-            expires = None
-
-        cookie = Cookie(
-                version=0,
-                name=c['name'],
-                value=c['value'],
-                port=None,
-                port_specified=False,
-                discard=False,
-                comment=None,
-                comment_url=None,
-                domain=c['domain'],
-                domain_specified=domain_specified,
-                domain_initial_dot=domain_initial_dot,
-                expires=expires,
-                path=path,
-                path_specified=path_specified,
-                rest={'HttpOnly': c['httpOnly']},
-                secure=c['secure'])
+        cookie = _saved_cookie(c['name'], c['value'], c['domain'], c['path'], c['secure'], c.get('expiry'), c['httpOnly'])
 
         log.debug(f"cookejar cookie: { cookie }\n")
 
         cookies.set_cookie(cookie)
 
-    cookies.save(ignore_discard=True, ignore_expires=True)
+    _save_cookies(cookies, config)
     return cookies
 
+
+def _saved_cookie(name, value, domain, path, secure, expiry, http_only):
+    """ make a cookie to keep in COOKIE_FILE
+
+        The expiry is pushed out 10 years so the jar keeps sending it; the real expiry is kept in
+        the vc_expires attribute for session_time_left.
+    """
+
+    path_specified = path != None
+
+    domain_specified = domain != None
+    domain_initial_dot = domain_specified and domain[0] == '.'
+
+    rest = {'HttpOnly': http_only}
+
+    if expiry != None:
+        expires = expiry + 86400 * 365 * 10 # add 10 years to expiry
+
+        # ... but remember the real expiry, so we know when to log in again
+        rest['vc_expires'] = expiry
+    else:
+        expires = None
+
+    return Cookie(
+            version=0,
+            name=name,
+            value=value,
+            port=None,
+            port_specified=False,
+            discard=False,
+            comment=None,
+            comment_url=None,
+            domain=domain,
+            domain_specified=domain_specified,
+            domain_initial_dot=domain_initial_dot,
+            expires=expires,
+            path=path,
+            path_specified=path_specified,
+            rest=rest,
+            secure=secure)
@@ -0,0 +1,87 @@
+#! /usr/bin/env python3
+
+# workbook_registry -- parse each report once per run, however many outputs use it
+
+import os
+import logging
+import hashlib
+import threading
+import collections
+
+import report_table
+
+log = logging.getLogger(__name__)
+
+
+# how many parsed reports to keep; the least recently used one goes first
+REGISTRY_SIZE = 8
+
+# content hash -> ReportTable, least recently used first
+_tables = collections.OrderedDict()
+
+# report file -> ((mtime, size), content hash), so an unchanged file isn't hashed again
+_hashes = {}
+
+_lock = threading.Lock()
+
+
+def get_table(report_file, formatting_info=False):
+    """ return the parsed report in report_file, parsing it only if we haven't seen its contents
+
+        Tables are keyed by a hash of the file's bytes, so the same report reached through
+        different paths (or downloaded twice) is still only parsed once.  A table parsed with
+        formatting_info also serves requests without it, but not the other way round.
+
+        The table is shared: callers that change cells must work on table.copy().
+    """
+
+    key = content_hash(report_file)
+
+    with _lock:
+        table = _tables.get(key)
+        if table is not None and (table.formatting_info or not formatting_info):
+            _tables.move_to_end(key)
+            log.debug(f"reusing parsed report { key[:12] } for { report_file }")
+            return table
+
+    table = report_table.open_table(report_file, formatting_info=formatting_info)
+
+    with _lock:
+        _tables[key] = table
+        _tables.move_to_end(key)
+        while len(_tables) > REGISTRY_SIZE:
+            old_key, old_table = _tables.popitem(last=False)
+            log.debug(f"dropping parsed report { old_key[:12] }")
+
+    return table
+
+
+def content_hash(report_file):
+    """ sha256 of a report file's contents """
+
+    stat = os.stat(report_file)
+    signature = (stat.st_mtime_ns, stat.st_size)
+
+    with _lock:
+        seen = _hashes.get(report_file)
+        if seen is not None and seen[0] == signature:
+            return seen[1]
+
+    digest = hashlib.sha256()
+    with open(report_file, 'rb') as fh:
+        for chunk in iter(lambda: fh.read(1024 * 1024), b''):
+            digest.update(chunk)
+    key = digest.hexdigest()
+
+    with _lock:
+        _hashes[report_file] = (signature, key)
+
+    return key
+
+
+def clear():
+    """ forget every parsed report """
+
+    with _lock:
+        _tables.clear()
+        _hashes.clear()